@@ -0,0 +1,53 @@
+import logging
+import tomllib
+from typing import Dict, List
+
+# Settings an account may override, named as in .env
+ACCOUNT_SETTINGS = (
+    "IMAP_SERVER",
+    "IMAP_PORT",
+    "IMAP_SSL",
+    "IMAP_USERNAME",
+    "IMAP_PASSWORD",
+    "INBOX_FOLDER",
+    "SPAM_FOLDER",
+    "MAX_EMAILS_TO_PROCESS",
+    "FETCH_MODE",
+    "PARTIAL_FETCH_BYTES",
+    "FETCH_CHUNK_SIZE",
+    "SPAM_EXAMPLES_FILE",
+)
+
+
+def load_accounts(path: str) -> List[Dict]:
+    """
+    Read the [[account]] tables of a TOML accounts file
+
+    Keys are the lowercase names of ACCOUNT_SETTINGS plus an optional name
+    for logs and metrics; settings left out fall back to the environment.
+    """
+    try:
+        with open(path, "rb") as f:
+            config = tomllib.load(f)
+    except (OSError, tomllib.TOMLDecodeError) as e:
+        logging.error(f"Failed to read accounts file {path}: {e}")
+        raise SystemExit(f"FATAL: Failed to read accounts file {path}: {e}")
+
+    accounts = config.get("account")
+    if not isinstance(accounts, list) or not accounts:
+        logging.error(f"No [[account]] entries in {path}")
+        raise SystemExit(f"FATAL: No [[account]] entries in {path}")
+
+    allowed = {setting.lower() for setting in ACCOUNT_SETTINGS} | {"name"}
+    names = set()
+    for i, account in enumerate(accounts, 1):
+        unknown = sorted(set(account) - allowed)
+        if unknown:
+            logging.error(f"Account {i} in {path}: unknown settings {unknown}")
+            raise SystemExit(f"FATAL: Unknown account settings {unknown} in {path}")
+        name = str(account.setdefault("name", f"account{i}"))
+        if name in names:
+            logging.error(f"Account name {name} used twice in {path}")
+            raise SystemExit(f"FATAL: Duplicate account name {name} in {path}")
+        names.add(name)
+    return accounts
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: HTML to text extraction
+
+Compares the former BeautifulSoup approach (parse, unwrap/decompose,
+serialize, parse again, get_text) with TextExtractor's single-pass parser
+and checks that both produce identical text. The third column measures the
+limited extraction used for the analysis text, which stops parsing once
+--max-length characters are collected.
+
+    uv run bench/bench_html_extraction.py [FILE_OR_DIR ...]
+
+Accepts .html files and .eml files (all text/html parts are used). Without
+arguments a synthetic 200 KB marketing newsletter is measured.
+
+lxml and selectolax are not offered as backends: their tree builders close
+and nest tags differently than html.parser, so the text would not match.
+"""
+
+import argparse
+import email
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from text_extractor import TextExtractor  # noqa: E402
+
+
+def two_pass_text(html_content: str) -> str:
+    """Reference: the extraction as it was done before with BeautifulSoup"""
+    soup = BeautifulSoup(html_content, "html.parser")
+    for tag in soup.find_all("a"):
+        tag.unwrap()
+    for tag in soup.find_all(
+        [
+            "img",
+            "link",
+            "script",
+            "style",
+            "video",
+            "audio",
+            "iframe",
+            "embed",
+            "object",
+            "meta",
+            "base",
+        ]
+    ):
+        tag.decompose()
+    soup = BeautifulSoup(str(soup), "html.parser")
+    raw_text = soup.get_text(separator=" ", strip=True)
+    return TextExtractor._clean_invisible_chars(raw_text)
+
+
+def synthetic_newsletter(size: int = 200_000, seed: int = 1) -> str:
+    """Table layout with inline styles, tracking links and pixels"""
+    rng = random.Random(seed)
+    words = (
+        "Angebot Rabatt exklusiv heute nur jetzt sichern Newsletter Kunden "
+        "Versand kostenlos neue Kollektion entdecken Gutschein Sommer Sale"
+    ).split()
+    head = (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'>"
+        "<style>td{font-family:Arial}.btn{color:#fff}</style>"
+        "<!--[if mso]><style>table{border-collapse:collapse}</style><![endif]-->"
+        "</head><body><table width='100%' cellpadding='0' cellspacing='0'>"
+    )
+    rows = []
+    length = len(head)
+    while length < size:
+        text = " ".join(rng.choice(words) for _ in range(rng.randint(5, 30)))
+        link = f"https://click.example.com/t/{rng.getrandbits(64):x}"
+        row = (
+            f"<tr><td style='padding:10px;color:#333' class='c{rng.randint(1, 9)}'>"
+            f"<a href='{link}'><img src='{link}.png' width='600' alt='Banner'></a>"
+            f"<p style='margin:0'>{text} <b>{rng.choice(words)}</b>&nbsp;&amp;‌ "
+            f"<a href='{link}' class='btn'>{rng.choice(words)}</a>.</p>"
+            f"<span style='display:none'>͏­</span></td></tr>"
+        )
+        rows.append(row)
+        length += len(row)
+    tail = (
+        "</table><img src='https://t.example.com/open.gif' width='1' height='1'>"
+        "</body></html>"
+    )
+    return head + "".join(rows) + tail
+
+
+def load_documents(paths):
+    documents = []
+    for path in paths:
+        files = sorted(path.rglob("*")) if path.is_dir() else [path]
+        for file in files:
+            if file.suffix.lower() in (".html", ".htm"):
+                documents.append(
+                    (file.name, file.read_text(encoding="utf-8", errors="ignore"))
+                )
+            elif file.suffix.lower() == ".eml":
+                message = email.message_from_bytes(file.read_bytes())
+                for part in message.walk():
+                    if part.get_content_type() == "text/html":
+                        payload = part.get_payload(decode=True) or b""
+                        documents.append(
+                            (file.name, payload.decode("utf-8", errors="ignore"))
+                        )
+    return documents
+
+
+def measure(function, html_content: str, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(html_content)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTML extraction benchmark")
+    parser.add_argument("paths", nargs="*", type=Path, help=".html/.eml files or dirs")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per document")
+    parser.add_argument(
+        "--max-length", type=int, default=300, help="Limit as MAIL_BODY_LENGTH"
+    )
+    args = parser.parse_args()
+
+    documents = load_documents(args.paths) if args.paths else []
+    if not documents:
+        documents = [("synthetic newsletter", synthetic_newsletter())]
+
+    def limited_text(html_content: str) -> str:
+        return TextExtractor._html_to_text(html_content, args.max_length)
+
+    total_old = total_new = total_limited = 0.0
+    mismatches = 0
+    for name, html_content in documents:
+        full_text = two_pass_text(html_content)
+        if full_text != TextExtractor._html_to_text(html_content):
+            mismatches += 1
+            print(f"MISMATCH: {name}")
+        elif (
+            full_text[: args.max_length].strip()
+            != limited_text(html_content)[: args.max_length].strip()
+        ):
+            mismatches += 1
+            print(f"MISMATCH (limited): {name}")
+        old = measure(two_pass_text, html_content, args.repeat)
+        new = measure(TextExtractor._html_to_text, html_content, args.repeat)
+        limited = measure(limited_text, html_content, args.repeat)
+        total_old += old
+        total_new += new
+        total_limited += limited
+        print(
+            f"{name[:40]:40} {len(html_content) / 1024:8.1f} KB  "
+            f"two-pass {old * 1000:8.1f} ms  single-pass {new * 1000:8.1f} ms  "
+            f"limited {limited * 1000:8.2f} ms  x{old / new:.1f}"
+        )
+
+    print(
+        f"\n{len(documents)} documents, {mismatches} mismatches, "
+        f"total two-pass {total_old * 1000:.1f} ms, single-pass "
+        f"{total_new * 1000:.1f} ms, speedup x{total_old / total_new:.1f}, "
+        f"limited to {args.max_length} chars {total_limited * 1000:.2f} ms"
+    )
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+IMAP benchmark: round trips, bytes and wall time of the fetch and move
+phases against the fake IMAP server
+
+    uv run bench/bench_imap.py [--sizes 100,1000,5000] [--latency 0.02]
+                               [--bandwidth 50]
+
+For every mailbox size a synthetic INBOX is generated. EmailClient then
+fetches the newest --emails messages in both FETCH_MODEs, syncs again with
+a state store once without and once with --new new mails, and moves --spam
+of the fetched mails to the spam folder, as a batch with UID MOVE, as a batch with
+UID COPY/STORE/EXPUNGE (server without MOVE) and one by one. --latency
+is added to every IMAP command and --bandwidth limits the download, both
+simulate the distance to the provider.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from fake_imap import (  # noqa: E402
+    CAPABILITIES,
+    FakeImapServer,
+    FakeImapState,
+    fill_mailbox,
+    synthetic_message,
+)
+
+# Server capabilities per move variant
+MOVE_VARIANTS = {
+    "batch MOVE": CAPABILITIES,
+    "batch COPY": [c for c in CAPABILITIES if c != "MOVE"],
+    "per mail": CAPABILITIES,
+}
+
+
+def measure(state: FakeImapState, client, function) -> dict:
+    commands, bytes_sent, round_trips = (
+        state.commands,
+        state.bytes_sent,
+        client.round_trips,
+    )
+    start = time.perf_counter()
+    result = function()
+    return {
+        "wall_seconds": time.perf_counter() - start,
+        "round_trips": client.round_trips - round_trips,
+        "commands": state.commands - commands,
+        "bytes": state.bytes_sent - bytes_sent,
+        "result": result,
+    }
+
+
+def connected_client(port: int, state_store=None):
+    # Imported late, so the environment set up in main() is used
+    from email_client import EmailClient
+
+    os.environ["IMAP_PORT"] = str(port)
+    client = EmailClient(state_store=state_store)
+    if not client.connect():
+        raise SystemExit("FATAL: Cannot connect to the fake IMAP server")
+    return client
+
+
+def run_sync(args, state: FakeImapState, port: int, size: int) -> list:
+    """Follow-up runs with a state store: nothing new, then --new mails"""
+    from state_store import StateStore
+
+    results = []
+    os.environ["FETCH_MODE"] = "partial"
+    with tempfile.TemporaryDirectory() as directory:
+        state_store = StateStore(os.path.join(directory, "state.db"))
+        client = connected_client(port, state_store)
+        uids = [int(email_data["id"]) for email_data in client.fetch_latest_emails()]
+        state_store.set_high_water_mark(
+            client.account, client.inbox_folder, client.uidvalidity, max(uids)
+        )
+        client.disconnect()
+
+        client = connected_client(port, state_store)
+        result = measure(state, client, client.fetch_latest_emails)
+        client.disconnect()
+        result.pop("result")
+        results.append({"size": size, "phase": "sync unchanged", **result})
+
+        rng = random.Random(size)
+        for i in range(args.new):
+            state.deliver("INBOX", synthetic_message(size + i, rng, args.attachments))
+        client = connected_client(port, state_store)
+        result = measure(state, client, client.fetch_latest_emails)
+        client.disconnect()
+        result.pop("result")
+        results.append({"size": size, "phase": f"sync {args.new} new", **result})
+        state_store.close()
+    return results
+
+
+def run_size(args, size: int) -> list:
+    state = FakeImapState(latency=args.latency, bandwidth=args.bandwidth * 125_000)
+    fill_mailbox(state, size, attachment_ratio=args.attachments)
+    state.mailbox("SPAM")
+    results = []
+
+    with FakeImapServer(state) as server:
+        uids = []
+        for mode in ("partial", "full"):
+            os.environ["FETCH_MODE"] = mode
+            client = connected_client(server.port)
+            result = measure(state, client, client.fetch_latest_emails)
+            client.disconnect()
+            uids = [email_data["id"] for email_data in result.pop("result")]
+            results.append({"size": size, "phase": f"fetch {mode}", **result})
+
+        results.extend(run_sync(args, state, server.port, size))
+
+        for variant, capabilities in MOVE_VARIANTS.items():
+            spam_uids, uids = uids[: args.spam], uids[args.spam :]
+            state.capabilities = list(capabilities)
+            client = connected_client(server.port)
+            if variant == "per mail":
+                result = measure(
+                    state,
+                    client,
+                    lambda: {uid: client.move_to_spam(uid) for uid in spam_uids},
+                )
+            else:
+                result = measure(
+                    state, client, lambda: client.move_to_spam_batch(spam_uids)
+                )
+            client.disconnect()
+            moved = sum(1 for success, _ in result.pop("result").values() if success)
+            if moved != len(spam_uids):
+                print(f"{variant}: only {moved} of {len(spam_uids)} emails moved")
+            results.append({"size": size, "phase": f"move {variant}", **result})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IMAP fetch/move benchmark")
+    parser.add_argument(
+        "--sizes", default="100,1000,5000", help="Comma-separated INBOX sizes"
+    )
+    parser.add_argument("--emails", type=int, default=100, help="MAX_EMAILS_TO_PROCESS")
+    parser.add_argument(
+        "--new", type=int, default=10, help="Mails arriving before the last sync"
+    )
+    parser.add_argument(
+        "--spam", type=int, default=30, help="Emails moved per move variant"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="Seconds per IMAP command"
+    )
+    parser.add_argument(
+        "--bandwidth", type=float, default=50.0, help="Mbit/s, 0 = unlimited"
+    )
+    parser.add_argument(
+        "--attachments",
+        type=float,
+        default=0.1,
+        help="Share of mails with an attachment",
+    )
+    parser.add_argument("--json", type=Path, help="Also write the results here")
+    args = parser.parse_args()
+
+    os.environ.update(
+        IMAP_SERVER="127.0.0.1",
+        IMAP_SSL="false",
+        IMAP_USERNAME="bench",
+        IMAP_PASSWORD="bench",
+        INBOX_FOLDER="INBOX",
+        SPAM_FOLDER="SPAM",
+        MAX_EMAILS_TO_PROCESS=str(args.emails),
+    )
+
+    results = []
+    for size in (int(size) for size in args.sizes.split(",")):
+        results.extend(run_size(args, size))
+
+    print(
+        f"\n{'size':>6} {'phase':18} {'wall s':>8} {'round trips':>12} "
+        f"{'KB':>10} {'ms/mail':>8}"
+    )
+    for result in results:
+        count = {"fetch": args.emails, "sync": args.new, "move": args.spam}[
+            result["phase"].split()[0]
+        ]
+        per_mail = (
+            f"{result['wall_seconds'] * 1000 / count:8.1f}"
+            if count and result["phase"] != "sync unchanged"
+            else f"{'-':>8}"
+        )
+        print(
+            f"{result['size']:6} {result['phase']:18} {result['wall_seconds']:8.2f} "
+            f"{result['round_trips']:12} {result['bytes'] / 1024:10.1f} {per_mail}"
+        )
+
+    if args.json:
+        args.json.write_text(
+            json.dumps(
+                {
+                    "latency": args.latency,
+                    "bandwidth_mbit": args.bandwidth,
+                    "emails": args.emails,
+                    "spam": args.spam,
+                    "results": results,
+                },
+                indent=2,
+            )
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Offline throughput benchmark: replay .eml files through TextExtractor and
+SpamClassifier against the fake Ollama server
+
+    uv run bench/bench_offline.py [FILE_OR_DIR ...] [--latency 0.2] [--workers 2]
+
+Without arguments a synthetic corpus is generated. .eml files can be saved
+from a real mailbox with `uv run extract_emails.py --eml`. Settings from
+.env apply (prompt cache, example selection, MAIL_BODY_LENGTH, ...), except
+that OLLAMA_BASE_URL points at the fake server unless --ollama-url is given.
+
+Reports emails/s, p50/p95 latency per email and the peak RSS after each
+stage; --json writes the same figures for comparing runs.
+"""
+
+import argparse
+import email
+import json
+import os
+import random
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bench_html_extraction import synthetic_newsletter  # noqa: E402
+from fake_ollama import FakeOllamaServer  # noqa: E402
+
+HAM_WORDS = (
+    "Hallo Termin morgen Rechnung Projekt Bestellung Meeting Bericht Grüße "
+    "Versand Unterlagen Frage Antwort Woche Büro"
+).split()
+# The fake Ollama server calls emails with these words spam
+SPAM_WORDS = "Rabatt Gewinn Sale exklusiv jetzt sichern".split()
+
+
+def synthetic_corpus(count: int, seed: int = 1) -> list:
+    """Mix of newsletters, HTML and plain text mails, about a third spam"""
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(count):
+        spam = rng.random() < 0.35
+        words = HAM_WORDS + SPAM_WORDS if spam else HAM_WORDS
+        text = " ".join(rng.choice(words) for _ in range(rng.randint(20, 200)))
+        if spam:
+            text = f"{rng.choice(SPAM_WORDS[:3])} {text}"
+        kind = rng.random()
+        if kind < 0.3:
+            message = MIMEMultipart("alternative")
+            message.attach(MIMEText(text, "plain", "utf-8"))
+            message.attach(
+                MIMEText(synthetic_newsletter(rng.randint(20, 120) * 1000, i), "html")
+            )
+        elif kind < 0.7:
+            message = MIMEText(f"<html><body><p>{text}</p></body></html>", "html")
+        else:
+            message = MIMEText(text, "plain", "iso-8859-1")
+        message["Subject"] = f"{'WIN ' if spam else ''}Nachricht {i}"
+        message["From"] = f"{'promo' if spam else 'kollege'}{i % 17}@example.com"
+        corpus.append((f"synthetic-{i}", message.as_bytes()))
+    return corpus
+
+
+def load_corpus(paths) -> list:
+    corpus = []
+    for path in paths:
+        files = sorted(path.rglob("*.eml")) if path.is_dir() else [path]
+        corpus.extend((file.name, file.read_bytes()) for file in files)
+    return corpus
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(round(fraction * (len(values) - 1)), len(values) - 1)]
+
+
+def stage_result(name: str, latencies: list, wall_time: float) -> dict:
+    return {
+        "stage": name,
+        "emails": len(latencies),
+        "wall_seconds": wall_time,
+        "emails_per_second": len(latencies) / wall_time if wall_time else 0.0,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        # Process-wide, so a stage shows the peak reached up to its end
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def timed(function, items) -> tuple[list, list, float]:
+    results, latencies = [], []
+    start = time.perf_counter()
+    for item in items:
+        item_start = time.perf_counter()
+        results.append(function(item))
+        latencies.append(time.perf_counter() - item_start)
+    return results, latencies, time.perf_counter() - start
+
+
+def run(args, corpus) -> list:
+    # Imported late, so the environment set up in main() is used
+    from spam_classifier import SpamClassifier
+    from text_extractor import TextExtractor
+
+    stages = []
+    messages, latencies, wall_time = timed(
+        lambda item: email.message_from_bytes(item[1]), corpus
+    )
+    stages.append(stage_result("parse", latencies, wall_time))
+
+    texts, latencies, wall_time = timed(
+        lambda message: TextExtractor.prepare_email_for_analysis(
+            {
+                "subject": message.get("Subject", ""),
+                "from": message.get("From", ""),
+                "message": message,
+            }
+        ),
+        messages,
+    )
+    stages.append(stage_result("extract", latencies, wall_time))
+
+    classifier = SpamClassifier()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        results = list(executor.map(classifier.classify_email, texts))
+    wall_time = time.perf_counter() - start
+    stages.append(
+        stage_result("classify", [llm_time for _, llm_time, _ in results], wall_time)
+    )
+    spam_count = sum(1 for verdict, _, _ in results if verdict == "spam")
+    print(f"{len(corpus)} emails, {spam_count} classified as spam")
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline throughput benchmark")
+    parser.add_argument("paths", nargs="*", type=Path, help=".eml files or dirs")
+    parser.add_argument(
+        "--synthetic", type=int, default=200, help="Corpus size without paths"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="Fake Ollama seconds per request"
+    )
+    parser.add_argument(
+        "--prompt-token-latency",
+        type=float,
+        default=0.0,
+        help="Fake Ollama seconds per evaluated prompt token",
+    )
+    parser.add_argument(
+        "--token-latency",
+        type=float,
+        default=0.0,
+        help="Fake Ollama seconds per generated token",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="LLM requests kept in flight"
+    )
+    parser.add_argument(
+        "--ollama-url", help="Benchmark a real Ollama instead of the fake server"
+    )
+    parser.add_argument("--json", type=Path, help="Also write the results here")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    corpus = load_corpus(args.paths) if args.paths else synthetic_corpus(args.synthetic)
+    if not corpus:
+        print("No .eml files found")
+        return 1
+
+    if args.ollama_url:
+        os.environ["OLLAMA_BASE_URL"] = args.ollama_url
+        stages = run(args, corpus)
+    else:
+        with FakeOllamaServer(
+            latency=args.latency,
+            prompt_token_latency=args.prompt_token_latency,
+            token_latency=args.token_latency,
+        ) as server:
+            os.environ["OLLAMA_BASE_URL"] = server.base_url
+            os.environ["OLLAMA_MODEL"] = server.model
+            stages = run(args, corpus)
+
+    print(
+        f"\n{'stage':10} {'emails':>7} {'wall s':>8} {'emails/s':>10} "
+        f"{'p50 ms':>9} {'p95 ms':>9} {'peak RSS MB':>12}"
+    )
+    for stage in stages:
+        print(
+            f"{stage['stage']:10} {stage['emails']:7} {stage['wall_seconds']:8.2f} "
+            f"{stage['emails_per_second']:10.1f} {stage['p50_ms']:9.2f} "
+            f"{stage['p95_ms']:9.2f} {stage['peak_rss_mb']:12.1f}"
+        )
+
+    if args.json:
+        args.json.write_text(
+            json.dumps(
+                {"workers": args.workers, "latency": args.latency, "stages": stages},
+                indent=2,
+            )
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: prompt assembly per email
+
+Compares rendering all few-shot examples for every email, as
+LangChain's FewShotPromptTemplate did, with SpamClassifier's precompiled
+prompt, where prefix and examples are rendered once and only the email is
+appended. Checks that both produce the identical prompt.
+
+    uv run bench/bench_prompt.py [--examples 10,100,1000] [--emails 200]
+
+With langchain-ollama installed (uv sync --extra langchain) the LangChain
+template is measured as a third column.
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from spam_classifier import (  # noqa: E402
+    EXAMPLE_TEMPLATE,
+    PROMPT_PREFIX,
+    PROMPT_SUFFIX,
+    SpamClassifier,
+)
+
+WORDS = (
+    "Angebot Rabatt Rechnung Termin Projekt Gutschein Bestellung Versand "
+    "Newsletter Konto Zahlung exklusiv jetzt Meeting Bericht Sale"
+).split()
+
+
+def synthetic_examples(count: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    return [
+        {
+            "email": (
+                f"Subject: {' '.join(rng.choice(WORDS) for _ in range(5))}\n"
+                f"From: sender{i}@example{i % 50}.com\n"
+                f"Body: {' '.join(rng.choice(WORDS) for _ in range(40))}"
+            ),
+            "classification": rng.choice(("typ 1", "typ 2")),
+        }
+        for i in range(count)
+    ]
+
+
+def per_request_prompt(examples: list, email_text: str) -> str:
+    """Reference: every example rendered again for each email"""
+    return SpamClassifier._render_prompt(
+        SpamClassifier._build_prompt(
+            EXAMPLE_TEMPLATE.format(**example) for example in examples
+        ),
+        email_text,
+    )
+
+
+def langchain_template(examples: list):
+    try:
+        from langchain_core.prompts import FewShotPromptTemplate, PromptTemplate
+    except ImportError:
+        return None
+    return FewShotPromptTemplate(
+        examples=examples,
+        example_prompt=PromptTemplate.from_template(EXAMPLE_TEMPLATE),
+        prefix=PROMPT_PREFIX,
+        suffix=PROMPT_SUFFIX,
+        input_variables=["email"],
+    )
+
+
+def measure(function, emails: list, repeat: int) -> float:
+    """Median seconds per email"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for email_text in emails:
+            function(email_text)
+        timings.append((time.perf_counter() - start) / len(emails))
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt assembly benchmark")
+    parser.add_argument(
+        "--examples", default="10,100,1000", help="Comma-separated example counts"
+    )
+    parser.add_argument("--emails", type=int, default=200, help="Emails per run")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per count")
+    args = parser.parse_args()
+
+    emails = [
+        f"Subject: Nachricht {i}\nFrom: absender{i}@example.com\n"
+        + " ".join(random.Random(i).choice(WORDS) for _ in range(60))
+        for i in range(args.emails)
+    ]
+
+    mismatches = 0
+    print(
+        f"{'examples':>8} {'prompt KB':>10} {'per request us':>15} "
+        f"{'precompiled us':>15} {'langchain us':>13}"
+    )
+    for count in (int(count) for count in args.examples.split(",")):
+        examples = synthetic_examples(count)
+        prompt = SpamClassifier._build_prompt(
+            EXAMPLE_TEMPLATE.format(**example) for example in examples
+        )
+        template = langchain_template(examples)
+        for email_text in emails[:3]:
+            precompiled = SpamClassifier._render_prompt(prompt, email_text)
+            if precompiled != per_request_prompt(examples, email_text) or (
+                template and precompiled != template.format(email=email_text)
+            ):
+                mismatches += 1
+                print(f"MISMATCH: {count} examples")
+
+        per_request = measure(
+            lambda email_text: per_request_prompt(examples, email_text),
+            emails,
+            args.repeat,
+        )
+        precompiled = measure(
+            lambda email_text: SpamClassifier._render_prompt(prompt, email_text),
+            emails,
+            args.repeat,
+        )
+        langchain = f"{'-':>13}"
+        if template:
+            seconds = measure(
+                lambda email_text: template.format(email=email_text),
+                emails,
+                args.repeat,
+            )
+            langchain = f"{seconds * 1e6:13.1f}"
+        print(
+            f"{count:8} {len(prompt) / 1024:10.1f} {per_request * 1e6:15.1f} "
+            f"{precompiled * 1e6:15.1f} {langchain}"
+        )
+
+    print(f"\n{mismatches} mismatches")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
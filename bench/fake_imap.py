@@ -0,0 +1,696 @@
+#!/usr/bin/env python3
+"""
+In-process IMAP4rev1 stand-in server for offline fetch/move benchmarks
+
+Implements the subset of IMAP that EmailClient uses: CAPABILITY, LOGIN,
+SELECT/EXAMINE (with CONDSTORE), LIST, NOOP, IDLE, UID SEARCH, UID FETCH
+(including BODYSTRUCTURE, HEADER.FIELDS and partial section fetches),
+UID COPY/MOVE/STORE/EXPUNGE, EXPUNGE, CLOSE and LOGOUT. Every command can be
+delayed by an artificial latency and the responses throttled to a bandwidth
+to simulate a remote provider. The server
+speaks plain TCP, connect with IMAP_SSL=false.
+
+Standalone, e.g. for a manual run of main.py against a synthetic mailbox:
+
+    uv run bench/fake_imap.py --messages 2000 --latency 0.05
+    IMAP_SERVER=127.0.0.1 IMAP_PORT=1143 IMAP_SSL=false uv run main.py
+
+Any username and password are accepted. With .eml files or directories as
+arguments these are delivered to the INBOX instead.
+"""
+
+import argparse
+import email
+import email.policy
+import random
+import re
+import select
+import socketserver
+import threading
+import time
+from email.message import Message
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from pathlib import Path
+
+CAPABILITIES = ["IMAP4rev1", "UIDPLUS", "MOVE", "IDLE", "CONDSTORE"]
+
+
+class FakeMessage:
+    def __init__(self, uid: int, raw: bytes, modseq: int):
+        self.uid = uid
+        self.raw = raw
+        self.flags = set()
+        self.modseq = modseq
+        self._parsed = None
+
+    @property
+    def parsed(self) -> Message:
+        if self._parsed is None:
+            self._parsed = email.message_from_bytes(self.raw)
+        return self._parsed
+
+
+class FakeMailbox:
+    def __init__(self, name: str, uidvalidity: int = 1):
+        self.name = name
+        self.uidvalidity = uidvalidity
+        self.uidnext = 1
+        self.highestmodseq = 1
+        self.messages = []
+
+    def append(self, raw: bytes) -> int:
+        self.highestmodseq += 1
+        message = FakeMessage(self.uidnext, raw, self.highestmodseq)
+        self.messages.append(message)
+        self.uidnext += 1
+        return message.uid
+
+
+class FakeImapState:
+    """Mailboxes plus settings shared by all connections of one server"""
+
+    def __init__(self, latency: float = 0.0, capabilities=None, bandwidth: float = 0):
+        self.latency = latency
+        # Bytes per second sent to each client, 0 = unlimited
+        self.bandwidth = bandwidth
+        self.capabilities = list(capabilities or CAPABILITIES)
+        self.mailboxes = {}
+        self.lock = threading.RLock()
+        self.changed = threading.Condition(self.lock)
+        self.commands = 0
+        self.bytes_sent = 0
+
+    def mailbox(self, name: str) -> FakeMailbox:
+        with self.lock:
+            if name.upper() == "INBOX":
+                name = "INBOX"
+            if name not in self.mailboxes:
+                self.mailboxes[name] = FakeMailbox(name)
+            return self.mailboxes[name]
+
+    def deliver(self, name: str, raw: bytes) -> int:
+        """Append a message and wake up IDLE-ing connections"""
+        with self.changed:
+            uid = self.mailbox(name).append(raw)
+            self.changed.notify_all()
+            return uid
+
+
+def _tokenize(data: str) -> list:
+    """Split command arguments into atoms, quoted strings and nested lists"""
+    stack = [[]]
+    i = 0
+    while i < len(data):
+        char = data[i]
+        if char == " ":
+            i += 1
+        elif char == "(":
+            stack.append([])
+            i += 1
+        elif char == ")":
+            inner = stack.pop()
+            stack[-1].append(inner)
+            i += 1
+        elif char == '"':
+            j = i + 1
+            value = ""
+            while data[j] != '"':
+                if data[j] == "\\":
+                    j += 1
+                value += data[j]
+                j += 1
+            stack[-1].append(value)
+            i = j + 1
+        else:
+            j = i
+            depth = 0
+            while j < len(data):
+                if data[j] == "[":
+                    depth += 1
+                elif data[j] == "]":
+                    depth -= 1
+                elif depth == 0 and data[j] in " ()":
+                    break
+                j += 1
+            stack[-1].append(data[i:j])
+            i = j
+    return stack[0]
+
+
+def _parse_set(spec: str, maximum: int) -> list:
+    """Expand an IMAP sequence set like 1:5,9,12:* into (low, high) ranges"""
+    ranges = []
+    for item in spec.split(","):
+        if ":" in item:
+            low, high = item.split(":")
+        else:
+            low = high = item
+        low = maximum if low == "*" else int(low)
+        high = maximum if high == "*" else int(high)
+        ranges.append((min(low, high), max(low, high)))
+    return ranges
+
+
+def _in_ranges(value: int, ranges: list) -> bool:
+    return any(low <= value <= high for low, high in ranges)
+
+
+def _quote(value) -> str:
+    if value is None:
+        return "NIL"
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _encoded_payload(part: Message) -> bytes:
+    payload = part.get_payload()
+    if isinstance(payload, list):
+        return b""
+    return payload.encode("ascii", "surrogateescape")
+
+
+def _bodystructure(part: Message) -> str:
+    if part.is_multipart():
+        children = "".join(_bodystructure(child) for child in part.get_payload())
+        return f"({children} {_quote(part.get_content_subtype())})"
+
+    params = part.get_params()[1:] if part.get_params() else []
+    param_list = (
+        "(" + " ".join(f"{_quote(k)} {_quote(v)}" for k, v in params) + ")"
+        if params
+        else "NIL"
+    )
+    payload = _encoded_payload(part)
+    encoding = part.get("Content-Transfer-Encoding", "7bit").strip()
+    fields = [
+        _quote(part.get_content_maintype()),
+        _quote(part.get_content_subtype()),
+        param_list,
+        "NIL",
+        "NIL",
+        _quote(encoding),
+        str(len(payload)),
+    ]
+    if part.get_content_maintype() == "text":
+        fields.append(str(payload.count(b"\n")))
+
+    disposition = part.get_content_disposition()
+    if disposition:
+        filename = part.get_filename()
+        disposition_params = (
+            f"({_quote('filename')} {_quote(filename)})" if filename else "NIL"
+        )
+        fields += ["NIL", f"({_quote(disposition)} {disposition_params})", "NIL"]
+    return "(" + " ".join(fields) + ")"
+
+
+def _find_part(message: Message, section: str) -> Message:
+    part = message
+    for index in section.split("."):
+        if not part.is_multipart():
+            if index == "1":
+                continue
+            raise KeyError(section)
+        part = part.get_payload()[int(index) - 1]
+    return part
+
+
+def _header_fields(raw: bytes, names: list) -> bytes:
+    headers, _, _ = raw.partition(b"\r\n\r\n")
+    if not _:
+        headers, _, _ = raw.partition(b"\n\n")
+    wanted = {name.upper() for name in names}
+    lines = []
+    keep = False
+    for line in headers.splitlines():
+        if line[:1] in (b" ", b"\t"):
+            if keep:
+                lines.append(line)
+            continue
+        name = line.split(b":", 1)[0].decode("ascii", "replace").upper()
+        keep = name in wanted
+        if keep:
+            lines.append(line)
+    return b"\r\n".join(lines) + b"\r\n\r\n"
+
+
+class FakeImapHandler(socketserver.StreamRequestHandler):
+    # Responses are flushed after each command and during IDLE
+    wbufsize = 65536
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.state = self.server.state
+        self.selected = None
+        self.readonly = False
+        self.known_exists = 0
+
+    def send_line(self, line):
+        if isinstance(line, str):
+            line = line.encode("utf-8")
+        self.send_raw(line + b"\r\n")
+
+    def send_raw(self, data: bytes):
+        self.state.bytes_sent += len(data)
+        if self.state.bandwidth:
+            time.sleep(len(data) / self.state.bandwidth)
+        self.wfile.write(data)
+
+    def handle(self):
+        self.send_line(
+            "* OK [CAPABILITY "
+            + " ".join(self.state.capabilities)
+            + "] fake IMAP ready"
+        )
+        self.wfile.flush()
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            line = line.rstrip(b"\r\n").decode("utf-8", "replace")
+            # Inline literals {n} as quoted strings
+            while re.search(r"\{(\d+)\}$", line):
+                size = int(re.search(r"\{(\d+)\}$", line).group(1))
+                self.send_line("+ go ahead")
+                self.wfile.flush()
+                literal = self.rfile.read(size).decode("utf-8", "replace")
+                rest = self.rfile.readline().rstrip(b"\r\n").decode("utf-8", "replace")
+                line = re.sub(r"\{\d+\}$", _quote(literal), line) + rest
+            if not line:
+                continue
+
+            if self.state.latency:
+                time.sleep(self.state.latency)
+            self.state.commands += 1
+
+            tag, _, rest = line.partition(" ")
+            command, _, args = rest.partition(" ")
+            command = command.upper()
+            uid_mode = command == "UID"
+            if uid_mode:
+                command, _, args = args.partition(" ")
+                command = command.upper()
+
+            try:
+                if not self.dispatch(tag, command, args, uid_mode):
+                    return
+            except (KeyError, ValueError, IndexError) as e:
+                self.send_line(f"{tag} BAD {e}")
+            self.wfile.flush()
+
+    def dispatch(self, tag, command, args, uid_mode) -> bool:
+        handler = getattr(self, f"cmd_{command.lower()}", None)
+        if handler is None:
+            self.send_line(f"{tag} BAD unknown command {command}")
+            return True
+        if uid_mode:
+            return handler(tag, args, uid_mode=True) is not False
+        return handler(tag, args) is not False
+
+    # -- connection state --------------------------------------------------
+
+    def cmd_capability(self, tag, args):
+        self.send_line("* CAPABILITY " + " ".join(self.state.capabilities))
+        self.send_line(f"{tag} OK CAPABILITY completed")
+
+    def cmd_login(self, tag, args):
+        self.send_line(f"{tag} OK LOGIN completed")
+
+    def cmd_logout(self, tag, args):
+        self.send_line("* BYE logging out")
+        self.send_line(f"{tag} OK LOGOUT completed")
+        self.wfile.flush()
+        return False
+
+    def cmd_noop(self, tag, args):
+        self.report_new_messages()
+        self.send_line(f"{tag} OK NOOP completed")
+
+    def cmd_list(self, tag, args):
+        with self.state.lock:
+            for name in self.state.mailboxes:
+                self.send_line(f'* LIST () "/" {_quote(name)}')
+        self.send_line(f"{tag} OK LIST completed")
+
+    def cmd_select(self, tag, args, readonly=False):
+        tokens = _tokenize(args)
+        with self.state.lock:
+            mailbox = self.state.mailbox(tokens[0])
+            self.selected = mailbox
+            self.readonly = readonly
+            self.known_exists = len(mailbox.messages)
+            self.send_line(f"* {len(mailbox.messages)} EXISTS")
+            self.send_line("* 0 RECENT")
+            self.send_line(r"* FLAGS (\Seen \Deleted)")
+            self.send_line(f"* OK [UIDVALIDITY {mailbox.uidvalidity}] UIDs valid")
+            self.send_line(f"* OK [UIDNEXT {mailbox.uidnext}] next UID")
+            if "CONDSTORE" in self.state.capabilities:
+                self.send_line(f"* OK [HIGHESTMODSEQ {mailbox.highestmodseq}] modseq")
+        mode = "READ-ONLY" if readonly else "READ-WRITE"
+        self.send_line(f"{tag} OK [{mode}] SELECT completed")
+
+    def cmd_examine(self, tag, args):
+        self.cmd_select(tag, args, readonly=True)
+
+    def cmd_close(self, tag, args):
+        if self.selected and not self.readonly:
+            self.expunge(silent=True)
+        self.selected = None
+        self.send_line(f"{tag} OK CLOSE completed")
+
+    def cmd_idle(self, tag, args):
+        self.send_line("+ idling")
+        self.wfile.flush()
+        while True:
+            with self.state.changed:
+                self.report_new_messages()
+                self.wfile.flush()
+            # A read timeout would break the buffered rfile, so poll with select
+            if not select.select([self.connection], [], [], 0.05)[0]:
+                continue
+            line = self.rfile.readline()
+            if not line or line.strip().upper() == b"DONE":
+                break
+        self.send_line(f"{tag} OK IDLE terminated")
+
+    def report_new_messages(self):
+        if self.selected is None:
+            return
+        with self.state.lock:
+            count = len(self.selected.messages)
+        if count != self.known_exists:
+            self.known_exists = count
+            self.send_line(f"* {count} EXISTS")
+
+    # -- message commands --------------------------------------------------
+
+    def matching(self, spec: str, uid_mode: bool) -> list:
+        messages = self.selected.messages
+        if uid_mode:
+            maximum = messages[-1].uid if messages else 0
+            ranges = _parse_set(spec, maximum)
+            return [m for m in messages if _in_ranges(m.uid, ranges)]
+        ranges = _parse_set(spec, len(messages))
+        return [m for i, m in enumerate(messages, 1) if _in_ranges(i, ranges)]
+
+    def cmd_search(self, tag, args, uid_mode=False):
+        tokens = _tokenize(args)
+        with self.state.lock:
+            result = list(self.selected.messages)
+            i = 0
+            while i < len(tokens):
+                key = tokens[i].upper() if isinstance(tokens[i], str) else ""
+                if key == "ALL":
+                    i += 1
+                elif key == "UID":
+                    allowed = {m.uid for m in self.matching(tokens[i + 1], True)}
+                    result = [m for m in result if m.uid in allowed]
+                    i += 2
+                elif key == "MODSEQ":
+                    modseq = int(tokens[i + 1])
+                    result = [m for m in result if m.modseq >= modseq]
+                    i += 2
+                elif re.match(r"^[\d:*,]+$", tokens[i]):
+                    allowed = {m.uid for m in self.matching(tokens[i], False)}
+                    result = [m for m in result if m.uid in allowed]
+                    i += 1
+                else:
+                    raise ValueError(f"unsupported search key {tokens[i]}")
+            sequence = {m.uid: i for i, m in enumerate(self.selected.messages, 1)}
+            numbers = [str(m.uid if uid_mode else sequence[m.uid]) for m in result]
+        self.send_line("* SEARCH" + "".join(" " + n for n in numbers))
+        self.send_line(f"{tag} OK SEARCH completed")
+
+    def cmd_fetch(self, tag, args, uid_mode=False):
+        tokens = _tokenize(args)
+        spec, items = tokens[0], tokens[1]
+        if isinstance(items, str):
+            items = [items]
+        changedsince = None
+        if len(tokens) > 2 and isinstance(tokens[2], list):
+            modifier = tokens[2]
+            if modifier and modifier[0].upper() == "CHANGEDSINCE":
+                changedsince = int(modifier[1])
+
+        with self.state.lock:
+            messages = self.matching(spec, uid_mode)
+            sequence = {m.uid: i for i, m in enumerate(self.selected.messages, 1)}
+            for message in messages:
+                if changedsince is not None and message.modseq <= changedsince:
+                    continue
+                self.send_fetch(sequence[message.uid], message, items, uid_mode)
+        self.send_line(f"{tag} OK FETCH completed")
+
+    def send_fetch(self, seq: int, message: FakeMessage, items: list, uid_mode: bool):
+        parts = []
+        literals = []
+        if uid_mode:
+            parts.append(f"UID {message.uid}")
+
+        for item in items:
+            upper = item.upper()
+            if upper == "UID":
+                if not uid_mode:
+                    parts.append(f"UID {message.uid}")
+            elif upper == "FLAGS":
+                parts.append(f"FLAGS ({' '.join(sorted(message.flags))})")
+            elif upper == "MODSEQ":
+                parts.append(f"MODSEQ ({message.modseq})")
+            elif upper == "RFC822.SIZE":
+                parts.append(f"RFC822.SIZE {len(message.raw)}")
+            elif upper == "BODYSTRUCTURE":
+                parts.append(f"BODYSTRUCTURE {_bodystructure(message.parsed)}")
+            elif upper == "RFC822":
+                literals.append(("RFC822", message.raw))
+            elif upper.startswith("BODY"):
+                name, data = self.body_item(message, item)
+                literals.append((name, data))
+
+        head = f"* {seq} FETCH (" + " ".join(parts)
+        if not literals:
+            self.send_line(head + ")")
+            return
+        for index, (name, data) in enumerate(literals):
+            prefix = head + (" " if parts else "") if index == 0 else " "
+            self.send_raw(f"{prefix}{name} {{{len(data)}}}\r\n".encode())
+            self.send_raw(data)
+        self.send_line(")")
+
+    def body_item(self, message: FakeMessage, item: str):
+        match = re.match(
+            r"^BODY(?:\.PEEK)?\[([^\]]*)\](?:<(\d+)(?:\.(\d+))?>)?$", item, re.I
+        )
+        if not match:
+            raise ValueError(f"unsupported fetch item {item}")
+        section, offset, length = match.groups()
+        upper = section.upper()
+        if upper.startswith("HEADER.FIELDS"):
+            names = _tokenize(section[len("HEADER.FIELDS") :].strip())[0]
+            data = _header_fields(message.raw, names)
+        elif upper == "HEADER":
+            data = message.raw.split(b"\r\n\r\n", 1)[0] + b"\r\n\r\n"
+        elif upper == "":
+            data = message.raw
+        elif upper == "TEXT":
+            data = message.raw.split(b"\r\n\r\n", 1)[-1]
+        else:
+            data = _encoded_payload(_find_part(message.parsed, section))
+
+        name = f"BODY[{section}]"
+        if offset is not None:
+            offset = int(offset)
+            data = data[offset:]
+            if length is not None:
+                data = data[: int(length)]
+            name += f"<{offset}>"
+        return name, data
+
+    def cmd_store(self, tag, args, uid_mode=False):
+        tokens = _tokenize(args)
+        spec, action, flags = tokens[0], tokens[1].upper(), tokens[2]
+        if isinstance(flags, str):
+            flags = [flags]
+        with self.state.lock:
+            for message in self.matching(spec, uid_mode):
+                if action.startswith("+"):
+                    message.flags.update(flags)
+                elif action.startswith("-"):
+                    message.flags.difference_update(flags)
+                else:
+                    message.flags = set(flags)
+                self.selected.highestmodseq += 1
+                message.modseq = self.selected.highestmodseq
+        self.send_line(f"{tag} OK STORE completed")
+
+    def cmd_copy(self, tag, args, uid_mode=False, move=False):
+        tokens = _tokenize(args)
+        spec, target_name = tokens[0], tokens[1]
+        with self.state.lock:
+            target = self.state.mailbox(target_name)
+            messages = self.matching(spec, uid_mode)
+            source_uids = []
+            target_uids = []
+            for message in messages:
+                source_uids.append(str(message.uid))
+                target_uids.append(str(target.append(message.raw)))
+            if messages and "UIDPLUS" in self.state.capabilities:
+                self.send_line(
+                    f"* OK [COPYUID {target.uidvalidity} "
+                    f"{','.join(source_uids)} {','.join(target_uids)}] copied"
+                )
+            if move:
+                for message in messages:
+                    message.flags.add("\\Deleted")
+                self.expunge(only={m.uid for m in messages})
+        self.send_line(f"{tag} OK {'MOVE' if move else 'COPY'} completed")
+
+    def cmd_move(self, tag, args, uid_mode=False):
+        if "MOVE" not in self.state.capabilities:
+            self.send_line(f"{tag} BAD MOVE not supported")
+            return
+        self.cmd_copy(tag, args, uid_mode=uid_mode, move=True)
+
+    def cmd_expunge(self, tag, args, uid_mode=False):
+        only = None
+        if uid_mode:
+            if "UIDPLUS" not in self.state.capabilities:
+                self.send_line(f"{tag} BAD UID EXPUNGE not supported")
+                return
+            with self.state.lock:
+                only = {m.uid for m in self.matching(args.strip(), True)}
+        self.expunge(only=only)
+        self.send_line(f"{tag} OK EXPUNGE completed")
+
+    def expunge(self, only=None, silent=False):
+        with self.state.lock:
+            messages = self.selected.messages
+            for seq in range(len(messages), 0, -1):
+                message = messages[seq - 1]
+                if "\\Deleted" in message.flags and (
+                    only is None or message.uid in only
+                ):
+                    del messages[seq - 1]
+                    if not silent:
+                        self.send_line(f"* {seq} EXPUNGE")
+            self.selected.highestmodseq += 1
+            self.known_exists = len(messages)
+
+
+class FakeImapServer(socketserver.ThreadingTCPServer):
+    """Threaded fake IMAP server; use as a context manager in benchmarks"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, state: FakeImapState = None, host="127.0.0.1", port=0):
+        self.state = state or FakeImapState()
+        super().__init__((host, port), FakeImapHandler)
+        self.thread = None
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+def synthetic_message(i: int, rng: random.Random, attachment_ratio: float) -> bytes:
+    """Plain, HTML or multipart/alternative mail, some with an attachment"""
+    spam = rng.random() < 0.35
+    words = (
+        "Hallo Termin morgen Rechnung Projekt Bestellung Meeting Bericht Grüße "
+        "Versand Unterlagen Frage Antwort Woche Büro"
+    ).split()
+    if spam:
+        words += "Rabatt Gewinn Sale exklusiv jetzt sichern".split()
+    text = " ".join(rng.choice(words) for _ in range(rng.randint(20, 400)))
+    kind = rng.random()
+    if kind < 0.4:
+        body = MIMEMultipart("alternative")
+        body.attach(MIMEText(text, "plain", "utf-8"))
+        body.attach(MIMEText(f"<html><body><p>{text}</p></body></html>", "html"))
+    elif kind < 0.7:
+        body = MIMEText(f"<html><body><p>{text}</p></body></html>", "html")
+    else:
+        body = MIMEText(text, "plain", "iso-8859-1")
+    if rng.random() < attachment_ratio:
+        message = MIMEMultipart("mixed")
+        message.attach(body)
+        message.attach(
+            MIMEApplication(rng.randbytes(rng.randint(50, 500) * 1000), Name="a.pdf")
+        )
+    else:
+        message = body
+    message["Subject"] = f"{'WIN ' if spam else ''}Nachricht {i}"
+    message["From"] = f"{'promo' if spam else 'kollege'}{i % 17}@example.com"
+    message["To"] = "me@example.com"
+    message["Message-ID"] = f"<{i}@fake.example.com>"
+    return message.as_bytes()
+
+
+def fill_mailbox(
+    state: FakeImapState,
+    count: int,
+    name: str = "INBOX",
+    attachment_ratio: float = 0.1,
+    seed: int = 1,
+):
+    rng = random.Random(seed)
+    for i in range(count):
+        state.deliver(name, synthetic_message(i, rng, attachment_ratio))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake IMAP server")
+    parser.add_argument("paths", nargs="*", type=Path, help=".eml files or dirs")
+    parser.add_argument("--port", type=int, default=1143)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds per command"
+    )
+    parser.add_argument(
+        "--bandwidth", type=float, default=0.0, help="Mbit/s per client, 0 = unlimited"
+    )
+    parser.add_argument(
+        "--messages", type=int, default=1000, help="Synthetic INBOX size without paths"
+    )
+    parser.add_argument(
+        "--attachments",
+        type=float,
+        default=0.1,
+        help="Share of synthetic mails with an attachment",
+    )
+    args = parser.parse_args()
+
+    state = FakeImapState(latency=args.latency, bandwidth=args.bandwidth * 125_000)
+    if args.paths:
+        for path in args.paths:
+            files = sorted(path.rglob("*.eml")) if path.is_dir() else [path]
+            for file in files:
+                state.deliver("INBOX", file.read_bytes())
+    else:
+        fill_mailbox(state, args.messages, attachment_ratio=args.attachments)
+    state.mailbox("SPAM")
+
+    with FakeImapServer(state, port=args.port) as server:
+        print(
+            f"Fake IMAP on 127.0.0.1:{server.port} with "
+            f"{len(state.mailbox('INBOX').messages)} messages, Ctrl+C stops"
+        )
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            pass
+        print(f"{state.commands} commands, {state.bytes_sent} bytes sent")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Stub HTTP server that mimics the parts of Ollama's REST API fdsmp uses
+
+/api/generate answers with a label derived from keywords in the last email
+of the prompt after a configurable latency, and reports token counts and
+durations the same way Ollama does. A prompt prefix shared with the
+previous request counts as cached, like Ollama's KV cache. /api/embed
+returns deterministic bag-of-words vectors.
+
+Used by the benchmarks in-process, or standalone for manual runs:
+
+    uv run bench/fake_ollama.py --port 11435 --latency 0.5
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SPAM_KEYWORDS = ("win", "prize", "gewinn", "rabatt", "sale", "viagra", "crypto")
+
+
+def _count_tokens(text: str) -> int:
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+
+def _label(prompt: str) -> str:
+    last_email = prompt.rsplit("Email:", 1)[-1].lower()
+    return "typ 2" if any(word in last_email for word in SPAM_KEYWORDS) else "typ 1"
+
+
+def _embed(text: str, dimensions: int = 64) -> list:
+    vector = [0.0] * dimensions
+    for word in re.findall(r"\w+", text.lower()):
+        digest = hashlib.md5(word.encode()).digest()
+        vector[digest[0] % dimensions] += 1.0
+    return vector
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes, avoid delayed-ACK stalls
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/version":
+            self._send_json({"version": "0.0.0-fake"})
+        elif self.path == "/api/tags":
+            self._send_json({"models": [{"name": self.server.model}]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        with self.server.lock:
+            self.server.requests += 1
+
+        if self.path == "/api/generate":
+            self._generate(request)
+        elif self.path == "/api/embed":
+            inputs = request.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            self._send_json(
+                {
+                    "model": request.get("model"),
+                    "embeddings": [_embed(text) for text in inputs],
+                    "prompt_eval_count": sum(_count_tokens(t) for t in inputs),
+                }
+            )
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def _generate(self, request: dict):
+        prompt = request.get("prompt", "")
+        options = request.get("options") or {}
+        prompt_tokens = _count_tokens(prompt)
+
+        # Pretend a stable prefix stays in the KV cache between requests
+        cached = 0
+        with self.server.lock:
+            previous = self.server.last_prompt
+            self.server.last_prompt = prompt
+        if previous:
+            common = 0
+            for a, b in zip(previous, prompt):
+                if a != b:
+                    break
+                common += 1
+            cached = _count_tokens(prompt[:common])
+        evaluated = max(prompt_tokens - cached, 1)
+
+        label = _label(prompt)
+        if request.get("format"):
+            response = json.dumps({"classification": label})
+        else:
+            response = f"Looking at this email, the answer is {label}"
+        num_predict = options.get("num_predict")
+        if num_predict is not None and num_predict >= 0:
+            response = response[: max(num_predict * 4, 0)]
+        eval_count = max(_count_tokens(response), 1)
+
+        prompt_eval_duration = evaluated * self.server.prompt_token_latency
+        eval_duration = eval_count * self.server.token_latency
+        time.sleep(self.server.latency + prompt_eval_duration + eval_duration)
+
+        stats = {
+            "model": request.get("model"),
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((prompt_eval_duration + eval_duration) * 1e9),
+            "load_duration": 0,
+            "prompt_eval_count": evaluated,
+            "prompt_eval_duration": int(prompt_eval_duration * 1e9),
+            "eval_count": eval_count,
+            "eval_duration": int(eval_duration * 1e9),
+            "context": [1, 2, 3],
+        }
+
+        if request.get("stream", True):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            words = re.findall(r"\S+\s*", response) or [""]
+            chunks = [
+                {"model": request.get("model"), "response": word, "done": False}
+                for word in words
+            ]
+            chunks.append({**stats, "response": ""})
+            for chunk in chunks:
+                data = (json.dumps(chunk) + "\n").encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self._send_json({**stats, "response": response})
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    """Threaded fake Ollama server; use as a context manager in benchmarks"""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        latency: float = 0.0,
+        prompt_token_latency: float = 0.0,
+        token_latency: float = 0.0,
+        model: str = "fake",
+    ):
+        super().__init__((host, port), FakeOllamaHandler)
+        self.latency = latency
+        self.prompt_token_latency = prompt_token_latency
+        self.token_latency = token_latency
+        self.model = model
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.last_prompt = ""
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds added to every request"
+    )
+    parser.add_argument(
+        "--prompt-token-latency",
+        type=float,
+        default=0.0,
+        help="Seconds per evaluated prompt token",
+    )
+    parser.add_argument(
+        "--token-latency", type=float, default=0.0, help="Seconds per generated token"
+    )
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(
+        port=args.port,
+        latency=args.latency,
+        prompt_token_latency=args.prompt_token_latency,
+        token_latency=args.token_latency,
+    )
+    print(f"Fake Ollama listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,75 @@
 import imaplib
 import email
 import os
-from typing import List, Dict
-from dotenv import load_dotenv
+import re
+import select
+import ssl
+import threading
+import time
+from email.message import Message
+from typing import Dict, Iterator, List, Optional
 import logging
+from imap_parser import parse_fetch_response, find_text_part, format_uid_set
+from metrics import metrics
+from text_extractor import TextExtractor
 
-load_dotenv()
+# Headers needed for classification and display, fetched without the body
+HEADER_FIELDS = "SUBJECT FROM TO DATE MESSAGE-ID"
 
 
 class EmailClient:
-    def __init__(self, debug=False):
-        self.server = os.getenv("IMAP_SERVER")
-        self.port = int(os.getenv("IMAP_PORT", 993))
-        self.username = os.getenv("IMAP_USERNAME")
-        self.password = os.getenv("IMAP_PASSWORD")
-        self.inbox_folder = os.getenv("INBOX_FOLDER", "INBOX")
-        self.spam_folder = os.getenv("SPAM_FOLDER", "SPAM")
-        self.max_emails = int(os.getenv("MAX_EMAILS_TO_PROCESS", 3))
+    def __init__(self, debug=False, state_store=None, settings=None):
+        # Per-account settings from --accounts, the environment fills the gaps
+        self.settings = settings or {}
+        self.server = self._setting("IMAP_SERVER")
+        self.port = int(self._setting("IMAP_PORT", 993))
+        self.use_ssl = self._setting("IMAP_SSL", "true").lower() == "true"
+        self.username = self._setting("IMAP_USERNAME")
+        self.password = self._setting("IMAP_PASSWORD")
+        self.inbox_folder = self._setting("INBOX_FOLDER", "INBOX")
+        self.spam_folder = self._setting("SPAM_FOLDER", "SPAM")
+        self.max_emails = int(self._setting("MAX_EMAILS_TO_PROCESS", 3))
+        self.fetch_mode = self._setting("FETCH_MODE", "partial").lower()
+        self.partial_fetch_bytes = int(self._setting("PARTIAL_FETCH_BYTES", 65536))
+        self.fetch_chunk_size = int(self._setting("FETCH_CHUNK_SIZE", 50))
+        self.idle_poll_interval = int(self._setting("IDLE_POLL_INTERVAL", 60))
+        # NOOP interval while the session waits for the LLM, 0 = disconnect
+        self.keepalive_interval = int(self._setting("IMAP_KEEPALIVE_INTERVAL", 240))
         self.debug = debug
+        self.state_store = state_store
+        self.uidvalidity = None
+        # New emails left for the next run by MAX_EMAILS_TO_PROCESS
+        self.pending_emails = 0
+        # UIDs of the last fetch the server returned no message for
+        self.missing_uids = []
+        self.round_trips = 0
+        self.capabilities = None
         self.connection = None
+        # Mailbox selected in the current session and time of the last command
+        self.selected_folder = None
+        self.last_command = 0.0
+        self._keepalive_stop = None
+        self._keepalive_thread = None
+
+    def _setting(self, name: str, default=None):
+        value = self.settings.get(name.lower())
+        return os.getenv(name, default) if value is None else str(value)
+
+    @property
+    def account(self) -> str:
+        """Key identifying this mailbox account in the state store"""
+        return f"{self.username}@{self.server}"
 
     def connect(self) -> bool:
         try:
-            self.connection = imaplib.IMAP4_SSL(self.server, self.port)
-            self.connection.login(self.username, self.password)
+            with metrics.timer("imap_connect_seconds"):
+                imap_class = imaplib.IMAP4_SSL if self.use_ssl else imaplib.IMAP4
+                self.connection = imap_class(self.server, self.port)
+                self.connection.login(self.username, self.password)
+            metrics.add("imap_connects")
+            self.capabilities = None
+            self.selected_folder = None
+            self.last_command = time.monotonic()
             logging.info(f"Connected to {self.server}")
             return True
         except Exception as e:
@@ -44,38 +90,348 @@ class EmailClient:
                 logging.debug(f"Error during IMAP disconnect: {e}")
             finally:
                 self.connection = None
+                self.selected_folder = None
                 logging.info("Disconnected from IMAP server")
 
-    def fetch_latest_emails(self) -> List[Dict]:
+    def is_alive(self) -> bool:
+        """Check with a NOOP whether the connection is still usable"""
+        if not self.connection:
+            return False
+        try:
+            self.round_trips += 1
+            if self.connection.noop()[0] != "OK":
+                return False
+            self.last_command = time.monotonic()
+            return True
+        except Exception as e:
+            logging.debug(f"IMAP connection is gone: {e}")
+            return False
+
+    def ensure_connected(self) -> bool:
+        """
+        Reuse the open session and reconnect only if the server dropped it
+
+        A session used within the last IMAP_KEEPALIVE_INTERVAL seconds is
+        trusted as is, an older one is checked with NOOP first. If the server
+        dropped it anyway, the next command reconnects (see _command).
+        """
+        if self.connection:
+            if time.monotonic() - self.last_command < self.keepalive_interval:
+                return True
+            if self.is_alive():
+                return True
+            logging.info("IMAP session was dropped by the server, reconnecting")
+            metrics.add("imap_reconnects")
+            self.disconnect()
+        return self.connect()
+
+    def start_keepalive(self):
+        """Send NOOP every IMAP_KEEPALIVE_INTERVAL seconds until stop_keepalive()"""
+        if not self.connection or not self.keepalive_interval or self._keepalive_thread:
+            return
+        stop = threading.Event()
+
+        def keepalive():
+            # The owner does not use the connection until stop_keepalive()
+            while not stop.wait(self.keepalive_interval):
+                if not self.is_alive():
+                    logging.warning(
+                        "IMAP keepalive failed, will reconnect for the move"
+                    )
+                    return
+                metrics.add("imap_keepalives")
+
+        self._keepalive_stop = stop
+        self._keepalive_thread = threading.Thread(
+            target=metrics.bound(keepalive),
+            name=f"{threading.current_thread().name}-keepalive",
+            daemon=True,
+        )
+        self._keepalive_thread.start()
+
+    def stop_keepalive(self):
+        if self._keepalive_thread:
+            self._keepalive_stop.set()
+            self._keepalive_thread.join()
+            self._keepalive_thread = None
+
+    def _select(self, folder: str):
+        """SELECT a folder unless it is still selected in this session"""
+        if folder == self.selected_folder:
+            return "OK", [None]
+        metrics.add("imap_selects")
+        result = self._command("select", folder)
+        self.selected_folder = folder if result[0] == "OK" else None
+        return result
+
+    def _command(self, name: str, *args):
+        """
+        Run an imaplib command and count it as one round trip
+
+        A session the server dropped since its last use is reopened once,
+        with the same folder selected, and the command is sent again.
+        """
+        for attempt in range(2):
+            self.round_trips += 1
+            try:
+                result = getattr(self.connection, name)(*args)
+                self.last_command = time.monotonic()
+                return result
+            except (imaplib.IMAP4.abort, OSError) as e:
+                if attempt:
+                    raise
+                self._reopen(e)
+
+    def _reopen(self, error: Exception):
+        folder = self.selected_folder
+        logging.info(f"IMAP session was dropped by the server ({error}), reconnecting")
+        metrics.add("imap_reconnects")
+        self.disconnect()
+        if not self.connect():
+            raise error
+        if folder is None:
+            return
+        metrics.add("imap_selects")
+        self.round_trips += 1
+        status, data = self.connection.select(folder)
+        if status != "OK":
+            raise imaplib.IMAP4.abort(f"Cannot select {folder} again: {data}")
+        # UIDs from the old session are only valid with the same UIDVALIDITY
+        _, uidvalidity = self.connection.response("UIDVALIDITY")
+        if (
+            folder == self.inbox_folder
+            and self.uidvalidity is not None
+            and uidvalidity[0]
+            and int(uidvalidity[0]) != self.uidvalidity
+        ):
+            raise imaplib.IMAP4.abort(f"UIDVALIDITY of {folder} changed")
+        self.selected_folder = folder
+
+    def wait_for_new_mail(self, timeout: float) -> bool:
+        """
+        Block until the server announces new mail in the selected inbox
+
+        Uses IDLE (RFC 2177) if the server supports it, otherwise polls with
+        NOOP every IDLE_POLL_INTERVAL seconds. Returns False if the timeout
+        expired without new mail. Connection errors are raised to the caller.
+        """
         if not self.connection:
             raise Exception("Not connected to server")
+        if self._has_capability("IDLE"):
+            new_mail = self._idle(timeout)
+        else:
+            new_mail = self._poll(timeout)
+        self.last_command = time.monotonic()
+        return new_mail
+
+    def _idle(self, timeout: float) -> bool:
+        # imaplib in Python 3.11 has no IDLE, so talk to the socket directly
+        tag = self.connection._new_tag()
+        self.connection.tagged_commands.pop(tag, None)
+        self.round_trips += 1
+        self.connection.send(tag + b" IDLE\r\n")
+        response = self.connection.readline()
+        if not response.startswith(b"+"):
+            raise imaplib.IMAP4.error(
+                f"IDLE rejected: {response.decode(errors='replace').strip()}"
+            )
+
+        new_mail = False
+        sock = self.connection.socket()
+        deadline = time.monotonic() + timeout
+        try:
+            while not new_mail:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if (
+                    not self._has_buffered_data()
+                    and not select.select([sock], [], [], remaining)[0]
+                ):
+                    break
+                new_mail = self._is_exists_line(self._read_idle_line())
+        finally:
+            self.connection.send(b"DONE\r\n")
+
+        # Drain notifications until the server confirms the end of IDLE
+        while True:
+            line = self._read_idle_line()
+            if line.startswith(tag):
+                break
+            new_mail = new_mail or self._is_exists_line(line)
+        return new_mail
+
+    def _has_buffered_data(self) -> bool:
+        """
+        Check without blocking whether a response can be read right away
 
+        Lines already in imaplib's buffered reader or decrypted by SSL do not
+        wake up select(), so peek with the socket in non-blocking mode.
+        """
+        sock = self.connection.socket()
+        timeout = sock.gettimeout()
+        sock.setblocking(False)
         try:
-            self.connection.select(self.inbox_folder)
+            return bool(self.connection.file.peek(1))
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return False
+        finally:
+            sock.settimeout(timeout)
+
+    def _read_idle_line(self) -> bytes:
+        line = self.connection.readline()
+        if not line or line.upper().startswith(b"* BYE"):
+            raise imaplib.IMAP4.abort("Server closed the connection during IDLE")
+        if self.debug:
+            logging.info(f"IDLE: {line.decode(errors='replace').strip()}")
+        return line
+
+    @staticmethod
+    def _is_exists_line(line: bytes) -> bool:
+        return re.match(rb"\* \d+ EXISTS", line.upper()) is not None
 
-            # Use UID SEARCH instead of regular search for persistent IDs
-            status, messages = self.connection.uid("search", None, "ALL")
+    def _poll(self, timeout: float) -> bool:
+        # Forget the EXISTS count from SELECT, only new announcements matter
+        self.connection.response("EXISTS")
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.idle_poll_interval, remaining))
+            self.round_trips += 1
+            status, _ = self.connection.noop()
             if status != "OK":
-                raise Exception("Failed to search emails")
+                raise imaplib.IMAP4.abort("NOOP failed")
+            _, exists = self.connection.response("EXISTS")
+            if exists[0] is not None:
+                return True
 
-            email_uids = messages[0].split()
-            latest_uids = (
-                email_uids[-self.max_emails :]
-                if len(email_uids) >= self.max_emails
-                else email_uids
-            )
+    def fetch_latest_emails(self) -> List[Dict]:
+        return [
+            email_data for chunk in self.iter_latest_emails() for email_data in chunk
+        ]
+
+    def iter_latest_emails(self) -> Iterator[List[Dict]]:
+        """Yield the new emails chunk by chunk, as soon as each chunk is fetched"""
+        if not self.connection:
+            raise Exception("Not connected to server")
+
+        try:
+            search_start = time.time()
+            round_trips_start = self.round_trips
+            # A still selected inbox is reused, the server reports new mail
+            # in it with every response
+            uidnext = exists = None
+            if self.selected_folder != self.inbox_folder:
+                status, data = self._select(self.inbox_folder)
+                if status != "OK":
+                    raise Exception(f"Cannot select inbox folder: {data}")
+                _, uidvalidity = self.connection.response("UIDVALIDITY")
+                self.uidvalidity = int(uidvalidity[0]) if uidvalidity[0] else None
+                _, data = self.connection.response("UIDNEXT")
+                uidnext = int(data[0]) if data[0] else None
+                _, data = self.connection.response("EXISTS")
+                exists = int(data[-1]) if data[-1] else None
+
+            last_uid = 0
+            if self.state_store and self.uidvalidity is not None:
+                last_uid = self.state_store.sync_uidvalidity(
+                    self.account, self.inbox_folder, self.uidvalidity
+                )
 
-            emails = []
-            for email_uid in latest_uids:
-                # Use UID FETCH instead of regular fetch
-                status, msg_data = self.connection.uid("fetch", email_uid, "(RFC822)")
-                if status == "OK":
-                    raw_email = msg_data[0][1]
-                    email_message = email.message_from_bytes(raw_email)
+            # Only ask for UIDs that can be new, so the search costs in
+            # proportion to the new mail instead of the inbox size
+            search = None
+            if last_uid:
+                # New mail always gets a UID of at least UIDNEXT
+                if uidnext is None or uidnext > last_uid + 1:
+                    search = f"UID {last_uid + 1}:*"
+                elif self.debug:
+                    logging.info(f"No new emails since UID {last_uid} (UIDNEXT)")
+            elif exists is not None:
+                # Without a high-water mark only the newest messages are
+                # needed, address them by sequence number
+                if exists:
+                    search = f"{max(exists - self.max_emails + 1, 1)}:*"
+            else:
+                search = "ALL"
 
+            email_uids = []
+            if search:
+                # Use UID SEARCH instead of regular search for persistent IDs
+                status, messages = self._uid("search", None, search)
+                if status != "OK":
+                    raise Exception("Failed to search emails")
+                # "UID n:*" always matches the newest message, even below n
+                email_uids = [
+                    email_uid
+                    for email_uid in messages[0].split()
+                    if int(email_uid) > last_uid
+                ]
+
+            if self.state_store and self.uidvalidity is not None:
+                decided_uids = self.state_store.get_decided_uids(
+                    self.account,
+                    self.inbox_folder,
+                    self.uidvalidity,
+                    (int(email_uid) for email_uid in email_uids),
+                )
+                if decided_uids:
+                    logging.info(
+                        f"Skipping {len(decided_uids)} already classified emails"
+                    )
+                    email_uids = [
+                        email_uid
+                        for email_uid in email_uids
+                        if int(email_uid) not in decided_uids
+                    ]
+
+            if last_uid:
+                # The oldest new emails first: the high-water mark then only
+                # passes fetched UIDs and the rest follows with the next run
+                latest_uids = email_uids[: self.max_emails]
+            else:
+                # Without a mark only the newest emails are of interest
+                latest_uids = email_uids[-self.max_emails :]
+            self.pending_emails = len(email_uids) - len(latest_uids) if last_uid else 0
+            if self.pending_emails:
+                logging.info(
+                    f"{self.pending_emails} more new emails left for the next run "
+                    f"(MAX_EMAILS_TO_PROCESS={self.max_emails})"
+                )
+
+            metrics.add("imap_fetch_seconds", time.time() - search_start)
+            metrics.add("imap_fetch_round_trips", self.round_trips - round_trips_start)
+
+            self.missing_uids = []
+            fetched_count = 0
+            fetch_start = time.time()
+            round_trips_start = self.round_trips
+            for i in range(0, len(latest_uids), self.fetch_chunk_size):
+                chunk = [
+                    int(email_uid)
+                    for email_uid in latest_uids[i : i + self.fetch_chunk_size]
+                ]
+                chunk_start = time.time()
+                chunk_round_trips = self.round_trips
+
+                messages = {}
+                if self.fetch_mode == "partial":
+                    messages = self._fetch_partial(chunk)
+                missing = [uid for uid in chunk if uid not in messages]
+                if missing:
+                    messages.update(self._fetch_full(missing))
+
+                emails = []
+                for uid in chunk:
+                    email_message = messages.get(uid)
+                    if email_message is None:
+                        self.missing_uids.append(uid)
+                        continue
                     emails.append(
                         {
-                            "id": email_uid.decode(),  # Now stores UID instead of sequence number
+                            "id": str(uid),  # Now stores UID instead of sequence number
                             "subject": email_message.get("Subject", ""),
                             "from": email_message.get("From", ""),
                             "to": email_message.get("To", ""),
@@ -83,13 +439,168 @@ class EmailClient:
                         }
                     )
 
-            logging.info(f"Fetched {len(emails)} emails")
-            return emails
+                metrics.add("imap_fetch_seconds", time.time() - chunk_start)
+                metrics.add(
+                    "imap_fetch_round_trips", self.round_trips - chunk_round_trips
+                )
+                logging.info(
+                    f"Fetched chunk of {len(chunk)} emails in "
+                    f"{self.round_trips - chunk_round_trips} round trips "
+                    f"({time.time() - chunk_start:.2f}s)"
+                )
+                fetched_count += len(emails)
+                yield emails
+
+            logging.info(
+                f"Fetched {fetched_count} emails in {time.time() - fetch_start:.2f}s "
+                f"({self.round_trips - round_trips_start} round trips)"
+            )
+            if self.missing_uids:
+                # Kept below the high-water mark, the next run tries again
+                logging.warning(
+                    f"Server returned no message for UIDs "
+                    f"{format_uid_set(self.missing_uids)}"
+                )
 
         except Exception as e:
             logging.error(f"FATAL: Failed to fetch emails from IMAP server: {e}")
             raise SystemExit(f"FATAL: IMAP fetch failed: {e}")
 
+    def _uid(self, command: str, *args):
+        """Run a UID command, UIDs stay valid if the session is reopened"""
+        return self._command("uid", command, *args)
+
+    def _fetch_full(self, uids: List[int]) -> Dict[int, Message]:
+        """Download complete messages (RFC822) for a set of UIDs"""
+        # Use UID FETCH instead of regular fetch
+        status, msg_data = self._uid("fetch", format_uid_set(uids), "(RFC822)")
+        if status != "OK":
+            # Skipping the chunk would let the high-water mark pass it
+            raise imaplib.IMAP4.error(
+                f"UID FETCH failed: {self._error_message((status, msg_data))}"
+            )
+        metrics.add("imap_fetch_bytes", self._response_bytes(msg_data))
+        messages = {}
+        for uid, items in parse_fetch_response(msg_data).items():
+            if isinstance(items.get("RFC822"), bytes):
+                messages[uid] = email.message_from_bytes(items["RFC822"])
+        return messages
+
+    def _fetch_partial(self, uids: List[int]) -> Dict[int, Message]:
+        """
+        Fetch only the headers and the beginning of the text part
+
+        Returns single-part messages that TextExtractor handles like the
+        originals. UIDs missing from the result need a full fetch, also those
+        whose partial text part has no visible text (e.g. only HTML head and
+        CSS within PARTIAL_FETCH_BYTES).
+        """
+        try:
+            status, msg_data = self._uid(
+                "fetch",
+                format_uid_set(uids),
+                f"(UID BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS ({HEADER_FIELDS})])",
+            )
+            if status != "OK":
+                return {}
+            metrics.add("imap_fetch_bytes", self._response_bytes(msg_data))
+
+            # One FETCH per distinct section covers the whole chunk
+            structures = {}
+            sections = {}
+            for uid, items in parse_fetch_response(msg_data).items():
+                headers = items.get(f"BODY[HEADER.FIELDS ({HEADER_FIELDS})]")
+                if not isinstance(headers, bytes) or "BODYSTRUCTURE" not in items:
+                    continue
+                part = find_text_part(items["BODYSTRUCTURE"])
+                structures[uid] = (headers, part)
+                if part:
+                    sections.setdefault(part["section"], []).append(uid)
+
+            bodies = {}
+            for section, section_uids in sections.items():
+                status, msg_data = self._uid(
+                    "fetch",
+                    format_uid_set(section_uids),
+                    f"(UID BODY.PEEK[{section}]<0.{self.partial_fetch_bytes}>)",
+                )
+                if status != "OK":
+                    continue
+                metrics.add("imap_fetch_bytes", self._response_bytes(msg_data))
+                for uid, items in parse_fetch_response(msg_data).items():
+                    if isinstance(items.get(f"BODY[{section}]"), bytes):
+                        bodies[uid] = items[f"BODY[{section}]"]
+
+            messages = {}
+            for uid, (headers, part) in structures.items():
+                if part and uid not in bodies:
+                    continue
+                message = self._build_partial_message(
+                    headers, part, bodies.get(uid, b"")
+                )
+                if part and not (TextExtractor._part_to_text(message) or "").strip():
+                    logging.debug(f"No text in partial body of UID {uid}, fetching all")
+                    continue
+                messages[uid] = message
+            return messages
+
+        except Exception as e:
+            logging.debug(f"Partial fetch of UIDs {format_uid_set(uids)} failed: {e}")
+            return {}
+
+    @staticmethod
+    def _response_bytes(msg_data) -> int:
+        """Size of the data returned by a FETCH"""
+        return sum(
+            sum(len(item) for item in entry)
+            if isinstance(entry, tuple)
+            else len(entry or b"")
+            for entry in msg_data
+        )
+
+    def _build_partial_message(
+        self, headers: bytes, part: Optional[Dict], body: bytes
+    ) -> Message:
+        # The header block always ends with an empty line before the body,
+        # also if the server returned none of the requested fields
+        headers = headers.strip(b"\r\n")
+        raw_email = headers + b"\r\n" if headers else b""
+        if part:
+            if part["size"] > len(body):
+                body = self._trim_partial_body(body, part["encoding"])
+            content_type = part["type"]
+            if part["charset"]:
+                content_type += f'; charset="{part["charset"]}"'
+            raw_email += (
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Transfer-Encoding: {part['encoding']}\r\n"
+            ).encode()
+        return email.message_from_bytes(raw_email + b"\r\n" + body)
+
+    @staticmethod
+    def _trim_partial_body(body: bytes, encoding: str) -> bytes:
+        """Drop an incomplete trailing unit so the truncated body still decodes"""
+        if encoding == "base64":
+            data = b"".join(body.split())
+            return data[: len(data) - len(data) % 4]
+        if encoding == "quoted-printable":
+            return re.sub(rb"=[0-9A-Fa-f]?$", b"", body)
+        return body
+
+    def _has_capability(self, capability: str) -> bool:
+        """Check the CAPABILITY list the server announces after login"""
+        if self.capabilities is None:
+            self.round_trips += 1
+            status, data = self.connection.capability()
+            self.capabilities = (
+                set(data[0].decode().upper().split()) if status == "OK" else set()
+            )
+        return capability.upper() in self.capabilities
+
+    @staticmethod
+    def _error_message(result) -> str:
+        return result[1][0].decode() if result[1] and result[1][0] else "Unknown error"
+
     def move_to_spam(self, email_uid: str) -> tuple[bool, str]:
         """
         Move email to spam folder using UID (persistent identifier)
@@ -99,45 +610,97 @@ class EmailClient:
             - (True, "") if successful
             - (False, error_description) if failed
         """
+        return self.move_to_spam_batch([email_uid])[email_uid]
+
+    def move_to_spam_batch(self, email_uids: List[str]) -> Dict[str, tuple[bool, str]]:
+        """
+        Move a set of emails to the spam folder in as few round trips as possible
+
+        Uses UID MOVE (RFC 6851) if the server supports it, otherwise one
+        UID COPY plus UID EXPUNGE (UIDPLUS) or EXPUNGE for the whole set.
+
+        Returns:
+            dict[str, tuple[bool, str]]: (success, error_message) per UID,
+            same semantics as move_to_spam
+        """
         if not self.connection:
-            return False, "Not connected to server"
+            return {uid: (False, "Not connected to server") for uid in email_uids}
 
+        results = {}
+        move_start = time.time()
+        round_trips_start = self.round_trips
         try:
-            # First check if email still exists in inbox
-            select_result = self.connection.select(self.inbox_folder)
+            select_result = self._select(self.inbox_folder)
             if select_result[0] != "OK":
-                return False, f"Cannot select inbox folder: {select_result[1]}"
-
-            # Check if UID still exists
-            search_result = self.connection.uid("search", None, f"UID {email_uid}")
-            if search_result[0] != "OK" or not search_result[1][0]:
-                return (
-                    False,
-                    f"Email UID {email_uid} not found (may have been moved/deleted by user)",
-                )
-
-            # Use UID COPY and UID STORE for persistent operations
-            copy_result = self.connection.uid("copy", email_uid, self.spam_folder)
-            if copy_result[0] != "OK":
-                error_msg = (
-                    copy_result[1][0].decode() if copy_result[1] else "Unknown error"
-                )
-                return False, f"UID COPY failed: {error_msg}"
+                error = f"Cannot select inbox folder: {select_result[1]}"
+                return {uid: (False, error) for uid in email_uids}
 
-            store_result = self.connection.uid(
-                "store", email_uid, "+FLAGS", "\\Deleted"
+            # Check which UIDs still exist
+            search_result = self._uid(
+                "search", None, f"UID {format_uid_set(email_uids)}"
             )
-            if store_result[0] != "OK":
-                error_msg = (
-                    store_result[1][0].decode() if store_result[1] else "Unknown error"
-                )
-                return False, f"UID STORE failed: {error_msg}"
+            if search_result[0] != "OK":
+                error = f"UID SEARCH failed: {self._error_message(search_result)}"
+                return {uid: (False, error) for uid in email_uids}
+            existing = {int(uid) for uid in (search_result[1][0] or b"").split()}
+
+            present_uids = []
+            for uid in email_uids:
+                if int(uid) in existing:
+                    present_uids.append(uid)
+                else:
+                    results[uid] = (
+                        False,
+                        f"Email UID {uid} not found (may have been moved/deleted by user)",
+                    )
+            if not present_uids:
+                return results
 
-            self.connection.expunge()
+            uid_set = format_uid_set(present_uids)
+            if self._has_capability("MOVE"):
+                move_result = self._uid("move", uid_set, self.spam_folder)
+                if move_result[0] != "OK":
+                    error = f"UID MOVE failed: {self._error_message(move_result)}"
+                    results.update({uid: (False, error) for uid in present_uids})
+                    return results
+            else:
+                # Use UID COPY and UID STORE for persistent operations
+                copy_result = self._uid("copy", uid_set, self.spam_folder)
+                if copy_result[0] != "OK":
+                    error = f"UID COPY failed: {self._error_message(copy_result)}"
+                    results.update({uid: (False, error) for uid in present_uids})
+                    return results
 
-            if self.debug:
-                logging.info(f"Moved email UID {email_uid} to spam folder")
-            return True, ""
+                store_result = self._uid("store", uid_set, "+FLAGS.SILENT", "\\Deleted")
+                if store_result[0] != "OK":
+                    error = f"UID STORE failed: {self._error_message(store_result)}"
+                    results.update({uid: (False, error) for uid in present_uids})
+                    return results
+
+                # UID EXPUNGE leaves other messages flagged \Deleted alone
+                if self._has_capability("UIDPLUS"):
+                    expunge_result = self._uid("expunge", uid_set)
+                else:
+                    expunge_result = self._command("expunge")
+                if expunge_result[0] != "OK":
+                    # Copied, but still in the inbox with \Deleted set
+                    error = f"EXPUNGE failed: {self._error_message(expunge_result)}"
+                    results.update({uid: (False, error) for uid in present_uids})
+                    return results
+
+            metrics.add("imap_moved_emails", len(present_uids))
+            for uid in present_uids:
+                results[uid] = (True, "")
+                if self.debug:
+                    logging.info(f"Moved email UID {uid} to spam folder")
+            return results
 
         except Exception as e:
-            return False, f"IMAP operation failed: {str(e)}"
+            error = f"IMAP operation failed: {str(e)}"
+            for uid in email_uids:
+                results.setdefault(uid, (False, error))
+            return results
+
+        finally:
+            metrics.add("imap_move_seconds", time.time() - move_start)
+            metrics.add("imap_move_round_trips", self.round_trips - round_trips_start)
@@ -0,0 +1,106 @@
+import hashlib
+import logging
+import os
+from typing import Dict, List
+
+from ollama_client import OllamaClient
+
+
+class EmbeddingExampleSelector:
+    """
+    Select the examples most similar to an email by embedding cosine similarity
+
+    Example vectors are computed once with a local Ollama embedding model and
+    cached on disk, keyed by a hash of model and example text, so only new or
+    changed examples are embedded on startup.
+    """
+
+    def __init__(
+        self,
+        examples: List[Dict],
+        client: OllamaClient,
+        embedding_model: str,
+        top_k: int,
+        cache_file: str,
+    ):
+        try:
+            import numpy as np
+        except ImportError:
+            logging.error("EXAMPLE_SELECTOR=embedding requires numpy")
+            raise SystemExit(
+                "FATAL: numpy is not installed (uv sync --extra embeddings)"
+            )
+        self.np = np
+        self.examples = examples
+        self.client = client
+        self.embedding_model = embedding_model
+        self.top_k = top_k
+        self.cache_file = cache_file
+
+        self.matrix = self._normalize(self._embed_examples())
+        logging.info(
+            f"Example selection: top {self.top_k} of {len(self.examples)} "
+            f"examples by similarity ({self.embedding_model})"
+        )
+
+    def _example_hash(self, example: Dict) -> str:
+        key = f"{self.embedding_model}\0{example['email']}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _load_cache(self) -> Dict[str, object]:
+        if not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with self.np.load(self.cache_file, allow_pickle=False) as data:
+                return {key: data[key] for key in data.files}
+        except Exception as e:
+            logging.warning(
+                f"Ignoring unreadable embedding cache {self.cache_file}: {e}"
+            )
+            return {}
+
+    def _embed(self, texts: List[str]):
+        vectors = []
+        # Keep single requests small for the Raspberry Pi
+        for i in range(0, len(texts), 32):
+            vectors.extend(
+                self.client.embed(texts[i : i + 32], model=self.embedding_model)
+            )
+        return self.np.asarray(vectors, dtype=self.np.float32)
+
+    def _embed_examples(self):
+        cache = self._load_cache()
+        hashes = [self._example_hash(example) for example in self.examples]
+
+        missing = [i for i, key in enumerate(hashes) if key not in cache]
+        if missing:
+            logging.info(f"Embedding {len(missing)} new examples...")
+            vectors = self._embed([self.examples[i]["email"] for i in missing])
+            for i, vector in zip(missing, vectors):
+                cache[hashes[i]] = vector
+
+        # Only keep vectors of current examples
+        if missing or len(cache) != len(set(hashes)):
+            cache = {key: cache[key] for key in hashes}
+            try:
+                with open(self.cache_file, "wb") as f:
+                    self.np.savez(f, **cache)
+            except OSError as e:
+                logging.warning(
+                    f"Failed to write embedding cache {self.cache_file}: {e}"
+                )
+
+        return self.np.stack([cache[key] for key in hashes])
+
+    def _normalize(self, vectors):
+        norms = self.np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / self.np.maximum(norms, 1e-12)
+
+    def select_indices(self, email_text: str) -> List[int]:
+        """Return the indices of the top-k most similar examples, in file order"""
+        if len(self.examples) <= self.top_k:
+            return list(range(len(self.examples)))
+        query = self._normalize(self._embed([email_text])[0])
+        similarities = self.matrix @ query
+        top = self.np.argpartition(-similarities, self.top_k - 1)[: self.top_k]
+        return sorted(int(i) for i in top)
@@ -63,8 +63,13 @@ def sanitize_filename(text, max_length=30):
     return text or "email"
 
 
-def extract_emails_to_files(max_emails=None):
-    """Extract latest emails and save each to individual files in data/ directory"""
+def extract_emails_to_files(max_emails=None, save_eml=False):
+    """
+    Extract latest emails and save each to individual files in data/ directory
+
+    With save_eml, the fetched message is also saved as .eml file, e.g. as
+    corpus for bench/bench_offline.py.
+    """
     setup_logging()
     if max_emails:
         logging.info(
@@ -130,6 +135,11 @@ def extract_emails_to_files(max_emails=None):
 
                 logging.info(f"Saved: {filename}")
 
+                if save_eml:
+                    eml_path = data_dir / f"email_{email_id}.eml"
+                    eml_path.write_bytes(email_data["message"].as_bytes())
+                    logging.info(f"Saved: {eml_path.name}")
+
             except SystemExit:
                 raise  # Re-raise SystemExit to allow proper shutdown
             except Exception as e:
@@ -169,12 +179,17 @@ if __name__ == "__main__":
         metavar="N",
         help="Number of emails to extract (overrides .env MAX_EMAILS_TO_PROCESS)",
     )
+    parser.add_argument(
+        "--eml",
+        action="store_true",
+        help="Also save the messages as .eml files (FETCH_MODE=full for complete ones)",
+    )
     args = parser.parse_args()
 
     # Override MAX_EMAILS_TO_PROCESS if --emails is specified
     if args.emails:
         os.environ["MAX_EMAILS_TO_PROCESS"] = str(args.emails)
 
-    exit_code = extract_emails_to_files(max_emails=args.emails)
+    exit_code = extract_emails_to_files(max_emails=args.emails, save_eml=args.eml)
     print(f"\nExtraction completed with exit code: {exit_code}")
     sys.exit(exit_code)
@@ -0,0 +1,214 @@
+import re
+from typing import Dict, List, Optional
+
+_LITERAL_MARKER = re.compile(rb"\{(\d+)\}$")
+_ATOM_END = b" ()"
+
+
+def _tokenize(data: list) -> list:
+    """
+    Turn the data list returned by imaplib into a flat token list
+
+    imaplib hands out FETCH responses as a mix of plain lines and
+    (prefix, literal) tuples. Literals become bytes tokens, quoted strings
+    and atoms become str tokens, NIL becomes None.
+    """
+    tokens = []
+    for item in data:
+        if item is None:
+            continue
+        if isinstance(item, tuple):
+            prefix, literal = item
+            tokens.extend(_tokenize_text(_LITERAL_MARKER.sub(b"", prefix.rstrip())))
+            tokens.append(bytes(literal))
+        else:
+            tokens.extend(_tokenize_text(item))
+    return tokens
+
+
+def _tokenize_text(text: bytes) -> list:
+    tokens = []
+    i = 0
+    length = len(text)
+    while i < length:
+        char = text[i : i + 1]
+        if char in (b" ", b"\r", b"\n"):
+            i += 1
+        elif char in (b"(", b")"):
+            tokens.append(char.decode())
+            i += 1
+        elif char == b'"':
+            value = bytearray()
+            i += 1
+            while i < length and text[i : i + 1] != b'"':
+                if text[i : i + 1] == b"\\":
+                    i += 1
+                value += text[i : i + 1]
+                i += 1
+            tokens.append(_Quoted(value.decode("utf-8", errors="replace")))
+            i += 1
+        else:
+            # Atoms may contain bracketed sections with spaces and parens,
+            # e.g. BODY[HEADER.FIELDS (SUBJECT FROM)]<0>
+            start = i
+            depth = 0
+            while i < length:
+                char = text[i : i + 1]
+                if char == b"[":
+                    depth += 1
+                elif char == b"]":
+                    depth -= 1
+                elif depth == 0 and char in _ATOM_END:
+                    break
+                i += 1
+            atom = text[start:i].decode("utf-8", errors="replace")
+            tokens.append(None if atom.upper() == "NIL" else atom)
+    return tokens
+
+
+class _Quoted(str):
+    """Quoted string token, kept apart from parens and atoms while parsing"""
+
+
+def _parse_value(tokens: list, pos: int):
+    token = tokens[pos]
+    if token == "(" and not isinstance(token, _Quoted):
+        values = []
+        pos += 1
+        while pos < len(tokens) and not (
+            tokens[pos] == ")" and not isinstance(tokens[pos], _Quoted)
+        ):
+            value, pos = _parse_value(tokens, pos)
+            values.append(value)
+        return values, pos + 1
+    if isinstance(token, _Quoted):
+        return str(token), pos + 1
+    return token, pos + 1
+
+
+def _normalize_key(key: str) -> str:
+    """BODY[1]<0> -> BODY[1], BODY.PEEK[...] -> BODY[...]"""
+    key = key.upper().replace("BODY.PEEK[", "BODY[")
+    return re.sub(r"<\d+>$", "", key)
+
+
+def parse_fetch_response(data: list) -> Dict[int, Dict[str, object]]:
+    """
+    Parse (possibly multi-message) UID FETCH response data into
+    {uid: {ITEM: value}}
+
+    Messages without a UID item (unsolicited FETCH responses) are ignored.
+    """
+    tokens = _tokenize(data)
+    messages = {}
+    pos = 0
+    while pos < len(tokens):
+        # Each message is "<seq> (<key> <value> ...)"
+        if tokens[pos] != "(" or isinstance(tokens[pos], _Quoted):
+            pos += 1
+            continue
+        values, pos = _parse_value(tokens, pos)
+        items = {}
+        for i in range(0, len(values) - 1, 2):
+            if isinstance(values[i], str):
+                items[_normalize_key(values[i])] = values[i + 1]
+        if "UID" in items:
+            uid = int(items["UID"])
+            messages.setdefault(uid, {}).update(items)
+    return messages
+
+
+def format_uid_set(uids) -> str:
+    """Compress UIDs into an IMAP sequence set, e.g. 1001:1003,1060"""
+    ranges = []
+    for uid in sorted(set(int(uid) for uid in uids)):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ",".join(
+        str(low) if low == high else f"{low}:{high}" for low, high in ranges
+    )
+
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return str(value)
+
+
+def _params(value) -> Dict[str, str]:
+    if not isinstance(value, list):
+        return {}
+    return {
+        _text(value[i]).lower(): _text(value[i + 1])
+        for i in range(0, len(value) - 1, 2)
+    }
+
+
+def _is_attachment(disposition) -> bool:
+    return (
+        isinstance(disposition, list)
+        and bool(disposition)
+        and _text(disposition[0]).lower() == "attachment"
+    )
+
+
+def _walk_structure(structure: list, section: str, parts: List[Dict]):
+    if structure and isinstance(structure[0], list):
+        # multipart: children first, then the subtype
+        index = 0
+        for child in structure:
+            if not isinstance(child, list):
+                break
+            index += 1
+            child_section = f"{section}.{index}" if section else str(index)
+            _walk_structure(child, child_section, parts)
+        return
+
+    if len(structure) < 7:
+        return
+    content_type = f"{_text(structure[0])}/{_text(structure[1])}".lower()
+    # text parts carry a line count before the extension data
+    disposition_index = 9 if content_type.startswith("text/") else 8
+    disposition = (
+        structure[disposition_index] if len(structure) > disposition_index else None
+    )
+    parts.append(
+        {
+            "section": section or "1",
+            "type": content_type,
+            "charset": _params(structure[2]).get("charset", ""),
+            "encoding": _text(structure[5]).lower() or "7bit",
+            "size": int(structure[6]) if str(structure[6]).isdigit() else 0,
+            "attachment": _is_attachment(disposition),
+        }
+    )
+
+
+def find_text_part(
+    structure, preferred_types=("text/plain", "text/html")
+) -> Optional[Dict]:
+    """
+    Locate the first non-attachment body part of one of the preferred types
+    in a parsed BODYSTRUCTURE, in order of preference
+
+    Empty parts are only taken if no other part matches. Returns a dict with
+    section, type, charset, encoding and size, or None.
+    """
+    if not isinstance(structure, list):
+        return None
+    parts = []
+    _walk_structure(structure, "", parts)
+    for allow_empty in (False, True):
+        for content_type in preferred_types:
+            for part in parts:
+                if (
+                    part["type"] == content_type
+                    and not part["attachment"]
+                    and (part["size"] or allow_empty)
+                ):
+                    return part
+    return None
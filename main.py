@@ -4,13 +4,26 @@ import argparse
 import atexit
 import logging
 import os
+import queue
 import signal
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parseaddr
+from pathlib import Path
+from accounts import load_accounts
 from email_client import EmailClient
+from state_store import StateStore
+from sender_index import SenderIndex
+from verdict_cache import VerdictCache
 from text_extractor import TextExtractor
-from spam_classifier import SpamClassifier
+from spam_classifier import CONFIDENT_LABELS, SpamClassifier
+from metrics import metrics
 
 PID_FILE = "fdsmp.pid"
+# Slowest top-level imports shown by --profile-startup
+PROFILE_STARTUP_TOP = 15
 
 
 def cleanup_pid_file():
@@ -55,137 +68,257 @@ def check_single_instance():
     return True
 
 
-def setup_logging():
+def setup_logging(multi_account=False):
+    # With several accounts the thread name tells which account logged
+    account = "[%(threadName)s] " if multi_account else ""
     logging.basicConfig(
         level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(message)s",
+        format=f"%(asctime)s - %(levelname)s - {account}%(message)s",
         handlers=[logging.FileHandler("fdsmp.log"), logging.StreamHandler(sys.stdout)],
     )
 
 
-def main():
-    parser = argparse.ArgumentParser(description="fdsmp - automated spam filter")
-    parser.add_argument(
-        "--dry-run",
-        action="store_true",
-        help="Classify emails but do not move them to spam folder",
-    )
-    parser.add_argument(
-        "--debug",
-        action="store_true",
-        help="Enable debug logging for LLM classification",
-    )
-    parser.add_argument(
-        "--debug-prompt",
-        action="store_true",
-        help="Show full prompt sent to LLM (implies --debug)",
-    )
-    parser.add_argument(
-        "--emails",
-        type=int,
-        metavar="N",
-        help="Number of emails to process (overrides .env MAX_EMAILS_TO_PROCESS)",
-    )
-    args = parser.parse_args()
+def profile_startup(argv) -> int:
+    """
+    Run fdsmp again under python -X importtime and report the slowest imports
 
-    # --debug-prompt implies --debug
-    if args.debug_prompt:
-        args.debug = True
+    The run itself is unchanged, its log goes to stdout as usual. Imports
+    done later by a stage, such as the LLM setup on the first classification,
+    are included and listed under the module that triggered them.
+    """
+    import subprocess
 
-    # Override MAX_EMAILS_TO_PROCESS if --emails is specified
-    if args.emails:
-        import os
+    command = [sys.executable, "-X", "importtime", os.path.abspath(__file__), *argv]
+    start_time = time.time()
+    child = subprocess.run(command, stderr=subprocess.PIPE, text=True)
+    wall_time = time.time() - start_time
 
-        os.environ["MAX_EMAILS_TO_PROCESS"] = str(args.emails)
+    imports = []
+    for line in child.stderr.splitlines():
+        if not line.startswith("import time:"):
+            # Tracebacks and other output of the run
+            print(line, file=sys.stderr)
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue  # Header line
+        # Nested imports are indented by two spaces per level
+        imports.append((name[1:], int(self_us), int(cumulative_us)))
 
-    setup_logging()
+    top_level = [entry for entry in imports if not entry[0].startswith(" ")]
+    total_ms = sum(cumulative_us for _, _, cumulative_us in top_level) / 1000
+    print(f"\nStartup profile (-X importtime), run took {wall_time:.2f}s:")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for name, self_us, cumulative_us in sorted(
+        top_level, key=lambda entry: entry[2], reverse=True
+    )[:PROFILE_STARTUP_TOP]:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:9.1f}  {name}")
+    print(f"{total_ms:14.1f} {'':9}  total of {len(imports)} imported modules")
+    imported = {name.strip().split(".")[0] for name, _, _ in imports}
+    for package in ("langchain_core", "langchain_ollama", "numpy", "tokenizers"):
+        print(f"{package}: {'imported' if package in imported else 'not imported'}")
+    return child.returncode
 
-    # Check for single instance before doing anything else
-    if not check_single_instance():
-        return 1
 
-    if args.dry_run:
-        logging.info("Starting fdsmp - spam filter (DRY RUN MODE)")
-    else:
-        logging.info("Starting fdsmp - spam filter")
+def prepare_email(email_data, text_extractor, sender_index=None, verdict_cache=None):
+    """Decode headers, extract the text and look up verdicts known without the LLM"""
+    try:
+        from email.header import decode_header
 
-    email_client = EmailClient(debug=args.debug)
-    text_extractor = TextExtractor()
-    spam_classifier = SpamClassifier(debug=args.debug, debug_prompt=args.debug_prompt)
+        # Decode subject for display
+        subject = email_data["subject"]
+        try:
+            decoded_parts = decode_header(subject)
+            decoded_subject = ""
+            for part, encoding in decoded_parts:
+                if isinstance(part, bytes):
+                    decoded_subject += part.decode(encoding or "utf-8", errors="ignore")
+                else:
+                    decoded_subject += part
+            subject = decoded_subject.strip()
+        except Exception:
+            pass
 
-    try:
-        if not email_client.connect():
-            logging.error("Failed to connect to email server")
-            return 1
+        # Decode sender for display
+        sender = email_data["from"]
+        try:
+            decoded_parts = decode_header(sender)
+            decoded_sender = ""
+            for part, encoding in decoded_parts:
+                if isinstance(part, bytes):
+                    decoded_sender += part.decode(encoding or "utf-8", errors="ignore")
+                else:
+                    decoded_sender += part
+            sender = decoded_sender.strip()
+        except Exception:
+            pass
+
+        text = text_extractor.prepare_email_for_analysis(email_data)
+        # Known senders skip the LLM
+        fast_verdict = sender_index.lookup(sender) if sender_index else None
+        # So do repeated or near-identical mails
+        cached_verdict = None
+        if verdict_cache and not fast_verdict:
+            cached_verdict = verdict_cache.lookup(text)
+        metrics.add("emails_processed")
+        metrics.add("fast_path_hits", 1 if fast_verdict else 0)
+        metrics.add("verdict_cache_hits", 1 if cached_verdict else 0)
+        if verdict_cache and not fast_verdict:
+            metrics.add("verdict_cache_misses", 0 if cached_verdict else 1)
+
+        return {
+            "email_data": email_data,
+            "subject": subject,
+            "sender": sender,
+            "text": text,
+            "fast_verdict": fast_verdict,
+            "cached_verdict": cached_verdict,
+        }
+
+    except SystemExit:
+        raise  # Re-raise SystemExit to allow proper shutdown
+    except Exception as e:
+        logging.error(
+            f"FATAL: Error processing email {email_data.get('subject', 'Unknown')}: {e}"
+        )
+        raise SystemExit(f"FATAL: Email processing failed: {e}")
+
+
+def process_mailbox(
+    args,
+    email_client,
+    text_extractor,
+    spam_classifier,
+    sender_index=None,
+    verdict_cache=None,
+    state_store=None,
+    keep_connection=False,
+):
+    """
+    Fetch, classify and move the new mail of one run
+
+    Expects a connected email_client. Unless keep_connection is set, the IMAP
+    connection is closed during classification and reopened for the move.
+    """
+    if args.pipeline:
+        return process_mailbox_pipelined(
+            args,
+            email_client,
+            text_extractor,
+            spam_classifier,
+            sender_index,
+            verdict_cache,
+            state_store,
+            keep_connection,
+        )
 
-        # PHASE 1: FETCH - Get emails and disconnect IMAP
-        logging.info("=== PHASE 1: FETCHING EMAILS ===")
-        emails = email_client.fetch_latest_emails()
-        if not emails:
-            logging.info("No emails to process")
-            return 0
+    # PHASE 1: FETCH - Get emails and disconnect IMAP
+    logging.info("=== PHASE 1: FETCHING EMAILS ===")
+    emails = email_client.fetch_latest_emails()
+    if not emails:
+        logging.info("No emails to process")
+        return 0
 
-        # Disconnect IMAP to avoid timeouts during LLM processing
+    # Verdicts are only persisted for real runs
+    record_state = (
+        state_store is not None
+        and email_client.uidvalidity is not None
+        and not args.dry_run
+    )
+    record_verdict = None
+    if record_state:
+        mailbox = (
+            email_client.account,
+            email_client.inbox_folder,
+            email_client.uidvalidity,
+        )
+
+        def record_verdict(uid, verdict, sender, learn=True):
+            _record_verdict(
+                state_store, sender_index, mailbox, uid, verdict, sender, learn
+            )
+
+    # Keep the session alive with NOOPs during LLM processing, so the move
+    # needs no new handshake; IMAP_KEEPALIVE_INTERVAL=0 disconnects instead
+    if not keep_connection and not email_client.keepalive_interval:
         email_client.disconnect()
 
-        # PHASE 2: CLASSIFY - Offline LLM processing (no IMAP timeouts)
-        logging.info("=== PHASE 2: CLASSIFYING EMAILS (OFFLINE) ===")
-        spam_email_uids = []
-        processed_count = 0
-        total_llm_time = 0.0
+    # PHASE 2: CLASSIFY - Offline LLM processing (no IMAP timeouts)
+    logging.info("=== PHASE 2: CLASSIFYING EMAILS (OFFLINE) ===")
+    spam_email_uids = []
+    failed_uids = []
+    llm_times = []
+    fast_path_count = 0
 
-        for email_data in emails:
-            try:
-                from email.header import decode_header
+    # Decode headers and extract text first, so the LLM requests can be
+    # kept in flight back to back
+    prepared_emails = [
+        prepare_email(email_data, text_extractor, sender_index, verdict_cache)
+        for email_data in emails
+    ]
 
-                # Decode subject for display
-                subject = email_data["subject"]
-                try:
-                    decoded_parts = decode_header(subject)
-                    decoded_subject = ""
-                    for part, encoding in decoded_parts:
-                        if isinstance(part, bytes):
-                            decoded_subject += part.decode(
-                                encoding or "utf-8", errors="ignore"
-                            )
-                        else:
-                            decoded_subject += part
-                    subject = decoded_subject.strip()
-                except Exception:
-                    pass
-
-                # Decode sender for display
-                sender = email_data["from"]
-                try:
-                    decoded_parts = decode_header(sender)
-                    decoded_sender = ""
-                    for part, encoding in decoded_parts:
-                        if isinstance(part, bytes):
-                            decoded_sender += part.decode(
-                                encoding or "utf-8", errors="ignore"
-                            )
-                        else:
-                            decoded_sender += part
-                    sender = decoded_sender.strip()
-                except Exception:
-                    pass
-
-                processed_count += 1
+    # With --workers N, keep N requests in flight and collect results in order
+    executor = None
+    futures = {}
+    if args.workers > 1:
+        executor = ThreadPoolExecutor(
+            max_workers=args.workers,
+            thread_name_prefix=threading.current_thread().name,
+        )
+        classify_email = metrics.bound(spam_classifier.classify_email)
+        futures = {
+            index: executor.submit(classify_email, prepared["text"])
+            for index, prepared in enumerate(prepared_emails)
+            if not (prepared["fast_verdict"] or prepared["cached_verdict"])
+        }
+
+    classify_start = time.time()
+    email_client.start_keepalive()
+    try:
+        for processed_count, prepared in enumerate(prepared_emails, 1):
+            email_data = prepared["email_data"]
+            subject = prepared["subject"]
+            sender = prepared["sender"]
+            try:
                 logging.info(f"Processing email {processed_count}/{len(emails)}:")
                 logging.info(f"👨 From: {sender}")
                 logging.info(
                     f"📧 Subject: {subject[:50]}{'...' if len(subject) > 50 else ''}"
                 )
 
-                email_text = text_extractor.prepare_email_for_analysis(email_data)
-
-                classification, llm_time = spam_classifier.classify_email(email_text)
-                total_llm_time += llm_time
+                # Only confident answers teach the sender history
+                learn = True
+                if prepared["fast_verdict"]:
+                    classification = prepared["fast_verdict"]
+                    fast_path_count += 1
+                    if args.debug:
+                        logging.info(f"⚡ Known sender, skipping LLM: {classification}")
+                elif prepared["cached_verdict"]:
+                    classification = prepared["cached_verdict"]
+                    if args.debug:
+                        logging.info(
+                            f"⚡ Known content, skipping LLM: {classification}"
+                        )
+                else:
+                    if executor:
+                        classification, llm_time, label = futures[
+                            processed_count - 1
+                        ].result()
+                    else:
+                        classification, llm_time, label = (
+                            spam_classifier.classify_email(prepared["text"])
+                        )
+                    learn = label in CONFIDENT_LABELS
+                    llm_times.append(llm_time)
+                    # A fallback verdict must not spread to similar mail
+                    if verdict_cache and learn:
+                        verdict_cache.store(prepared["text"], classification)
 
-                if args.debug:
-                    logging.info(f"⏱️  LLM processing time: {llm_time:.2f}s")
+                    if args.debug:
+                        logging.info(f"⏱️  LLM processing time: {llm_time:.2f}s")
 
                 if classification == "spam":
+                    metrics.add("emails_spam")
                     # Collect spam email UID for later batch move operation
                     spam_email_uids.append(
                         {
@@ -199,6 +332,9 @@ def main():
                         f"❌ Spam detected: {subject[:50]}{'...' if len(subject) > 50 else ''}"
                     )
                 else:
+                    # Spam verdicts are recorded once the move succeeded
+                    if record_verdict:
+                        record_verdict(email_data["id"], classification, sender, learn)
                     if args.debug:
                         logging.info(
                             f"✅ Not spam: {subject[:50]}{'...' if len(subject) > 50 else ''}"
@@ -211,87 +347,830 @@ def main():
                     f"FATAL: Error processing email {email_data.get('subject', 'Unknown')}: {e}"
                 )
                 raise SystemExit(f"FATAL: Email processing failed: {e}")
+    finally:
+        email_client.stop_keepalive()
+        if executor:
+            # Fail fast: drop queued requests if one of them failed
+            executor.shutdown(wait=False, cancel_futures=True)
+    classify_wall_time = time.time() - classify_start
 
-        # PHASE 3: MOVE - Reconnect and batch move spam emails
-        spam_count = len(spam_email_uids)
-        if spam_count > 0:
-            logging.info(f"=== PHASE 3: MOVING {spam_count} SPAM EMAILS ===")
+    # PHASE 3: MOVE - Reconnect and batch move spam emails
+    spam_count = len(spam_email_uids)
+    if spam_count > 0:
+        logging.info(f"=== PHASE 3: MOVING {spam_count} SPAM EMAILS ===")
 
-            if args.dry_run:
-                logging.info("[DRY RUN] Would move the following spam emails:")
-                for spam_email in spam_email_uids:
-                    logging.info(
-                        f"  - {spam_email['subject']} (from {spam_email['sender']})"
-                    )
+        if args.dry_run:
+            logging.info("[DRY RUN] Would move the following spam emails:")
+            for spam_email in spam_email_uids:
+                logging.info(
+                    f"  - {spam_email['subject']} (from {spam_email['sender']})"
+                )
+            logging.info(
+                f"Processing complete. {spam_count} emails classified as spam (not moved)."
+            )
+        else:
+            # Reconnect only if the session is closed or was dropped
+            if not email_client.ensure_connected():
+                logging.error(
+                    "Failed to reconnect to email server for spam move operation"
+                )
+                return 1
+
+            # Move all spam in one batch, then report per UID
+            round_trips_start = email_client.round_trips
+            move_results = email_client.move_to_spam_batch(
+                [spam_email["uid"] for spam_email in spam_email_uids]
+            )
+            if args.debug:
                 logging.info(
-                    f"Processing complete. {spam_count} emails classified as spam (not moved)."
+                    f"Move phase took {email_client.round_trips - round_trips_start} round trips"
+                )
+
+            moved_count, disappeared_count, failed_uids = _record_moves(
+                spam_email_uids, move_results, record_verdict
+            )
+            failed_count = len(failed_uids) + disappeared_count
+
+            # Detailed completion summary
+            if failed_count == 0:
+                logging.info(
+                    f"Processing complete. All {moved_count}/{spam_count} spam emails moved successfully."
                 )
             else:
-                # Reconnect to IMAP for batch move operation
-                if not email_client.connect():
-                    logging.error(
-                        "Failed to reconnect to email server for spam move operation"
+                logging.info(
+                    f"Processing complete. {moved_count}/{spam_count} emails moved to spam folder."
+                )
+                if disappeared_count > 0:
+                    logging.info(
+                        f"  {disappeared_count} emails disappeared (likely moved/deleted by user)"
                     )
-                    return 1
+                if failed_count - disappeared_count > 0:
+                    logging.warning(
+                        f"  {failed_count - disappeared_count} emails failed to move due to other errors"
+                    )
+    else:
+        logging.info("=== PHASE 3: NO SPAM EMAILS TO MOVE ===")
+        logging.info("Processing complete. No spam emails found.")
+
+    if record_state:
+        state_store.set_high_water_mark(
+            *mailbox,
+            _next_high_water_mark(
+                [int(email_data["id"]) for email_data in emails],
+                failed_uids,
+                email_client.missing_uids,
+            ),
+        )
+
+    _log_summary(
+        args,
+        llm_times,
+        classify_wall_time,
+        fast_path_count,
+        len(emails),
+        sender_index,
+        verdict_cache,
+    )
+    return 0
+
+
+def _record_verdict(
+    state_store, sender_index, mailbox, uid, verdict, sender, learn=True
+):
+    """
+    Persist the final verdict of an email and let the sender index learn it
+
+    Without learn only the UID is marked as decided: a fallback verdict must
+    not send the sender past the LLM from now on, so it is stored without
+    the sender and never reaches the sender history.
+    """
+    sender_address = parseaddr(sender)[1].lower() if learn else ""
+    state_store.record_verdict(*mailbox, int(uid), verdict, sender_address)
+    if sender_index and learn:
+        sender_index.add_verdict(sender, verdict)
+
+
+def _record_moves(spam_emails, move_results, record_verdict=None):
+    """
+    Report the move result of each spam email and record the decided ones
+
+    Spam the user moved or deleted meanwhile counts as decided. Returns the
+    number of moved and disappeared emails and the UIDs that failed to move.
+    """
+    moved_count = 0
+    disappeared_count = 0
+    failed_uids = []
+    for spam_email in spam_emails:
+        success, error_message = move_results[spam_email["uid"]]
+        if success:
+            moved_count += 1
+            logging.info(f"Moved spam email: {spam_email['subject']}")
+        elif "not found" in error_message.lower():
+            disappeared_count += 1
+            logging.warning(
+                f"Email disappeared (user moved/deleted?): {spam_email['subject']} - {error_message}"
+            )
+        else:
+            failed_uids.append(int(spam_email["uid"]))
+            logging.error(
+                f"Failed to move spam email: {spam_email['subject']} - {error_message}"
+            )
+            continue
+
+        if record_verdict:
+            record_verdict(spam_email["uid"], "spam", spam_email["sender"])
+    return moved_count, disappeared_count, failed_uids
+
 
-                moved_count = 0
-                failed_count = 0
-                disappeared_count = 0
+def _next_high_water_mark(fetched_uids, failed_uids, missing_uids=()) -> int:
+    """
+    Advance the high-water mark, but keep spam that failed to move in reach
+
+    Also stays below UIDs the server returned no message for, so they are
+    fetched again by the next run.
+    """
+    held_back = [uid - 1 for uid in (*failed_uids, *missing_uids)]
+    return min([max(fetched_uids), *held_back])
+
+
+def _log_summary(
+    args,
+    llm_times,
+    wall_time,
+    fast_path_count,
+    email_count,
+    sender_index=None,
+    verdict_cache=None,
+):
+    """Report LLM latencies, fast path and cache hits and the IMAP sessions"""
+    total_llm_time = sum(llm_times)
+    logging.info(f"⏱️  Total LLM processing time: {total_llm_time:.2f}s")
+    if llm_times:
+        logging.info(
+            f"⏱️  Classification wall time: {wall_time:.2f}s with "
+            f"{args.workers} worker(s), per email avg "
+            f"{total_llm_time / len(llm_times):.2f}s, max {max(llm_times):.2f}s"
+        )
+    if sender_index:
+        logging.info(
+            f"⚡ Sender fast path: {fast_path_count}/{email_count} emails "
+            f"({fast_path_count / max(email_count, 1):.0%})"
+        )
+    # Per-run numbers, the cache and extractor live for the whole process
+    values = metrics.snapshot()
+    if verdict_cache:
+        logging.info(
+            f"⚡ Verdict cache: {values['verdict_cache_hits']} hits, "
+            f"{values['verdict_cache_misses']} misses"
+        )
+    log_imap_summary()
+    if args.debug:
+        logging.info(
+            f"Body text from: {values['body_text_plain']} plain text, "
+            f"{values['body_text_html']} HTML, "
+            f"{values['body_text_none']} without text"
+        )
+
+
+def log_imap_summary():
+    """Report the IMAP sessions of this run"""
+    values = metrics.snapshot()
+    logging.info(
+        f"📬 IMAP: {values['imap_connects']} handshakes "
+        f"({values['imap_reconnects']} after a dropped session), "
+        f"{values['imap_selects']} selects, {values['imap_keepalives']} keepalives"
+    )
+
+
+# End-of-stream marker between pipeline stages
+_DONE = object()
+
+
+def _put(stage_queue, item, stop) -> bool:
+    """Put an item into a bounded queue unless the pipeline is stopping"""
+    while not stop.is_set():
+        try:
+            stage_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _get(stage_queue, stop):
+    """Take the next item from a queue, _DONE once the pipeline is stopping"""
+    while not stop.is_set():
+        try:
+            return stage_queue.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return _DONE
+
+
+def _start_stage(name, target, stop, errors, *args) -> threading.Thread:
+    """Run a pipeline stage in a thread; the first failure stops all stages"""
+
+    def run():
+        try:
+            target(*args)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    thread = threading.Thread(
+        target=metrics.bound(run),
+        name=f"{threading.current_thread().name}-{name}",
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def process_mailbox_pipelined(
+    args,
+    email_client,
+    text_extractor,
+    spam_classifier,
+    sender_index=None,
+    verdict_cache=None,
+    state_store=None,
+    keep_connection=False,
+):
+    """
+    Fetch, extract, classify and move in concurrent stages
+
+    The stages are connected by bounded queues of PIPELINE_QUEUE_SIZE, so only
+    a few emails are in memory at any time and spam is moved as soon as it is
+    classified. Moves use a second IMAP connection.
+    """
+    queue_size = int(os.getenv("PIPELINE_QUEUE_SIZE", 10))
+    fetched = queue.Queue(maxsize=queue_size)
+    prepared = queue.Queue(maxsize=queue_size)
+    classified = queue.Queue(maxsize=queue_size)
+    spam = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+
+    fetched_uids = []
+    failed_uids = []
+    llm_times = []
+    counts = {"spam": 0, "fast_path": 0, "moved": 0, "disappeared": 0}
+
+    def mailbox():
+        # Known once the fetch stage has selected the inbox
+        return (
+            email_client.account,
+            email_client.inbox_folder,
+            email_client.uidvalidity,
+        )
+
+    def record_state():
+        return (
+            state_store is not None
+            and email_client.uidvalidity is not None
+            and not args.dry_run
+        )
+
+    def record_verdict(uid, verdict, sender, learn=True):
+        if record_state():
+            _record_verdict(
+                state_store, sender_index, mailbox(), uid, verdict, sender, learn
+            )
+
+    def fetch_stage():
+        try:
+            for chunk in email_client.iter_latest_emails():
+                for email_data in chunk:
+                    fetched_uids.append(int(email_data["id"]))
+                    if not _put(fetched, email_data, stop):
+                        return
+        finally:
+            # Moves use their own connection, this one is only kept for
+            # waiting in daemon mode
+            if keep_connection:
+                email_client.start_keepalive()
+            else:
+                email_client.disconnect()
+        _put(fetched, _DONE, stop)
+
+    def extract_stage():
+        while (email_data := _get(fetched, stop)) is not _DONE:
+            item = prepare_email(
+                email_data, text_extractor, sender_index, verdict_cache
+            )
+            # Only the text is needed from here on, drop the message object
+            item["email_data"] = {"id": email_data["id"]}
+            if not _put(prepared, item, stop):
+                return
+        _put(prepared, _DONE, stop)
+
+    def classify_stage():
+        while (item := _get(prepared, stop)) is not _DONE:
+            if item["fast_verdict"] or item["cached_verdict"]:
+                verdict = item["fast_verdict"] or item["cached_verdict"]
+                result = (item, verdict, None, None)
+            else:
+                result = (item, *spam_classifier.classify_email(item["text"]))
+            if not _put(classified, result, stop):
+                return
+        # Let the other workers see the end of the stream as well
+        _put(prepared, _DONE, stop)
+        _put(classified, _DONE, stop)
+
+    def move_stage():
+        move_client = None
+        try:
+            while (spam_email := _get(spam, stop)) is not _DONE:
+                # Move whatever has queued up in one batch
+                batch = [spam_email]
+                while len(batch) < queue_size:
+                    try:
+                        spam_email = spam.get_nowait()
+                    except queue.Empty:
+                        break
+                    if spam_email is _DONE:
+                        _put(spam, _DONE, stop)
+                        break
+                    batch.append(spam_email)
 
-                for spam_email in spam_email_uids:
-                    success, error_message = email_client.move_to_spam(
-                        spam_email["uid"]
+                if args.dry_run:
+                    for spam_email in batch:
+                        logging.info(
+                            f"[DRY RUN] Would move: {spam_email['subject']} "
+                            f"(from {spam_email['sender']})"
+                        )
+                    continue
+
+                if move_client is None:
+                    move_client = EmailClient(
+                        debug=args.debug, settings=email_client.settings
                     )
+                # Batches can be minutes apart while the LLM works
+                if not move_client.ensure_connected():
+                    raise SystemExit(
+                        "FATAL: Failed to connect to email server for spam move"
+                    )
+                move_results = move_client.move_to_spam_batch(
+                    [spam_email["uid"] for spam_email in batch]
+                )
+                moved_count, disappeared_count, batch_failed_uids = _record_moves(
+                    batch, move_results, record_verdict
+                )
+                counts["moved"] += moved_count
+                counts["disappeared"] += disappeared_count
+                failed_uids.extend(batch_failed_uids)
+        finally:
+            if move_client:
+                move_client.disconnect()
 
-                    if success:
-                        moved_count += 1
-                        logging.info(f"Moved spam email: {spam_email['subject']}")
-                    else:
-                        failed_count += 1
-                        if "not found" in error_message.lower():
-                            disappeared_count += 1
-                            logging.warning(
-                                f"Email disappeared (user moved/deleted?): {spam_email['subject']} - {error_message}"
-                            )
-                        else:
-                            logging.error(
-                                f"Failed to move spam email: {spam_email['subject']} - {error_message}"
-                            )
-
-                # Detailed completion summary
-                if failed_count == 0:
+    logging.info("=== PIPELINE: FETCH, CLASSIFY AND MOVE CONCURRENTLY ===")
+    pipeline_start = time.time()
+    threads = [
+        _start_stage("fetch", fetch_stage, stop, errors),
+        _start_stage("extract", extract_stage, stop, errors),
+        _start_stage("move", move_stage, stop, errors),
+    ]
+    workers = [
+        _start_stage(f"classify-{i}", classify_stage, stop, errors)
+        for i in range(max(args.workers, 1))
+    ]
+
+    try:
+        # Results arrive in completion order; verdicts are handled here
+        processed_count = 0
+        finished_workers = 0
+        while finished_workers < len(workers):
+            result = _get(classified, stop)
+            if result is _DONE:
+                if stop.is_set():
+                    break
+                finished_workers += 1
+                continue
+
+            item, classification, llm_time, label = result
+            processed_count += 1
+            subject = item["subject"]
+            sender = item["sender"]
+            short_subject = f"{subject[:50]}{'...' if len(subject) > 50 else ''}"
+            logging.info(f"Processing email {processed_count}:")
+            logging.info(f"👨 From: {sender}")
+            logging.info(f"📧 Subject: {short_subject}")
+
+            if llm_time is None:
+                if item["fast_verdict"]:
+                    counts["fast_path"] += 1
+                if args.debug:
                     logging.info(
-                        f"Processing complete. All {moved_count}/{spam_count} spam emails moved successfully."
+                        f"⚡ Known sender or content, skipping LLM: {classification}"
                     )
-                else:
-                    logging.info(
-                        f"Processing complete. {moved_count}/{spam_count} emails moved to spam folder."
+            else:
+                llm_times.append(llm_time)
+                # A fallback verdict must not spread to similar mail
+                if verdict_cache and label in CONFIDENT_LABELS:
+                    verdict_cache.store(item["text"], classification)
+                if args.debug:
+                    logging.info(f"⏱️  LLM processing time: {llm_time:.2f}s")
+
+            if classification == "spam":
+                counts["spam"] += 1
+                metrics.add("emails_spam")
+                logging.info(f"❌ Spam detected: {short_subject}")
+                _put(
+                    spam,
+                    {
+                        "uid": item["email_data"]["id"],
+                        "subject": short_subject,
+                        "sender": sender,
+                    },
+                    stop,
+                )
+            else:
+                # Spam verdicts are recorded once the move succeeded
+                # Only confident answers teach the sender history
+                record_verdict(
+                    item["email_data"]["id"],
+                    classification,
+                    sender,
+                    llm_time is None or label in CONFIDENT_LABELS,
+                )
+                if args.debug:
+                    logging.info(f"✅ Not spam: {short_subject}")
+
+        _put(spam, _DONE, stop)
+        for thread in threads + workers:
+            thread.join()
+    finally:
+        # Stop the remaining stages if this thread failed or was interrupted
+        stop.set()
+        email_client.stop_keepalive()
+
+    if errors:
+        raise errors[0]
+
+    if not fetched_uids:
+        logging.info("No emails to process")
+        return 0
+
+    pipeline_wall_time = time.time() - pipeline_start
+    if failed_uids:
+        logging.warning(f"{len(failed_uids)} spam emails failed to move")
+    logging.info(
+        f"Processing complete. {processed_count} emails in "
+        f"{pipeline_wall_time:.2f}s, {counts['spam']} spam, "
+        f"{counts['moved']} moved, {counts['disappeared']} disappeared"
+    )
+
+    if record_state():
+        state_store.set_high_water_mark(
+            *mailbox(),
+            _next_high_water_mark(fetched_uids, failed_uids, email_client.missing_uids),
+        )
+
+    _log_summary(
+        args,
+        llm_times,
+        pipeline_wall_time,
+        counts["fast_path"],
+        processed_count,
+        sender_index,
+        verdict_cache,
+    )
+    return 0
+
+
+def write_metrics(email_client, spam_classifier, exit_code):
+    """Export the metrics of a finished run (METRICS_JSON_FILE, METRICS_TEXTFILE)"""
+    metrics.add("run_failed", 1 if exit_code else 0)
+    metrics.write(account=email_client.account, model=spam_classifier.model_name)
+
+
+def run_daemon(args, email_client, **components):
+    """
+    Keep one IMAP session open and process new mail as soon as it arrives
+
+    Waits with IDLE between runs and reconnects with exponential backoff if
+    the connection or a run fails.
+    """
+    idle_timeout = int(os.getenv("IDLE_TIMEOUT", 29 * 60))
+    backoff_min = int(os.getenv("RECONNECT_BACKOFF_MIN", 5))
+    backoff_max = int(os.getenv("RECONNECT_BACKOFF_MAX", 300))
+    backoff = backoff_min
+
+    logging.info("Running as daemon, waiting for new mail with IMAP IDLE")
+    while True:
+        metrics.reset()
+        try:
+            if not email_client.connect():
+                raise ConnectionError("Failed to connect to email server")
+            while True:
+                exit_code = 1
+                try:
+                    exit_code = process_mailbox(
+                        args, email_client, keep_connection=True, **components
                     )
-                    if disappeared_count > 0:
-                        logging.info(
-                            f"  {disappeared_count} emails disappeared (likely moved/deleted by user)"
-                        )
-                    if failed_count - disappeared_count > 0:
-                        logging.warning(
-                            f"  {failed_count - disappeared_count} emails failed to move due to other errors"
-                        )
-        else:
-            logging.info("=== PHASE 3: NO SPAM EMAILS TO MOVE ===")
-            logging.info("Processing complete. No spam emails found.")
+                finally:
+                    # Also for runs ended by a FATAL SystemExit
+                    write_metrics(
+                        email_client, components["spam_classifier"], exit_code
+                    )
+                if exit_code:
+                    raise ConnectionError("Run failed")
+                backoff = backoff_min
+                if email_client.pending_emails:
+                    # Work through the rest without waiting for more mail
+                    metrics.reset()
+                    continue
+                # Also re-check after a timeout, IDLE must be renewed anyway
+                if email_client.wait_for_new_mail(idle_timeout):
+                    logging.info("New mail announced by server")
+                metrics.reset()
+        except SystemExit as e:
+            # Signals exit with code 0, FATAL errors carry their message
+            if not isinstance(e.code, str):
+                raise
+            logging.error(f"Run failed: {e.code}")
+        except Exception as e:
+            logging.error(f"IMAP connection lost: {e}")
+
+        email_client.disconnect()
+        logging.info(f"Reconnecting in {backoff}s")
+        time.sleep(backoff)
+        backoff = min(backoff * 2, backoff_max)
 
-        # Show total LLM processing time
-        logging.info(f"⏱️  Total LLM processing time: {total_llm_time:.2f}s")
+
+def create_components(
+    args,
+    text_extractor,
+    state_store,
+    examples_file=None,
+    request_slots=None,
+    verdict_cache_file=None,
+):
+    """Classifier with the sender index and verdict cache for its examples"""
+    spam_classifier = SpamClassifier(
+        debug=args.debug,
+        debug_prompt=args.debug_prompt,
+        examples_file=examples_file,
+        request_slots=request_slots,
+    )
+    sender_index = None
+    if os.getenv("SENDER_FAST_PATH", "true").lower() == "true":
+        sender_index = SenderIndex(
+            spam_classifier.spam_examples,
+            state_store.get_sender_verdicts() if state_store else (),
+            min_domain_votes=int(os.getenv("SENDER_DOMAIN_MIN_VOTES", 0)),
+        )
+    # An empty VERDICT_CACHE_FILE disables the verdict cache
+    verdict_cache = None
+    if os.getenv("VERDICT_CACHE_FILE", "fdsmp_verdicts.db"):
+        verdict_cache = VerdictCache(
+            spam_classifier.examples_file,
+            spam_classifier.model_name,
+            path=verdict_cache_file,
+        )
+
+    return {
+        "text_extractor": text_extractor,
+        "spam_classifier": spam_classifier,
+        "sender_index": sender_index,
+        "verdict_cache": verdict_cache,
+        "state_store": state_store,
+    }
+
+
+def run_accounts(args, accounts, state_store):
+    """
+    Process several IMAP accounts concurrently in one process
+
+    Every account runs in its own thread with its own IMAP connection.
+    Accounts with the same examples file share one classifier, sender index
+    and verdict cache, and all classifiers share --workers request slots, so
+    the model is loaded once and sees a single queue.
+    """
+    text_extractor = TextExtractor()
+    request_slots = threading.BoundedSemaphore(max(args.workers, 1))
+    default_examples = os.getenv("SPAM_EXAMPLES_FILE", "spam_examples.json")
+    components_by_file = {}
+    for account in accounts:
+        examples_file = account.get("spam_examples_file", default_examples)
+        if examples_file in components_by_file:
+            continue
+        # The verdict cache is cleared when its examples change, so every
+        # examples file gets a cache file of its own
+        verdict_cache_file = None
+        cache_file = os.getenv("VERDICT_CACHE_FILE", "fdsmp_verdicts.db")
+        if cache_file and examples_file != default_examples:
+            root, extension = os.path.splitext(cache_file)
+            verdict_cache_file = f"{root}.{Path(examples_file).stem}{extension}"
+        components_by_file[examples_file] = create_components(
+            args,
+            text_extractor,
+            state_store,
+            examples_file=examples_file,
+            request_slots=request_slots,
+            verdict_cache_file=verdict_cache_file,
+        )
+
+    results = {}
+
+    def run_account(account):
+        name = account["name"]
+        components = components_by_file[
+            account.get("spam_examples_file", default_examples)
+        ]
+        email_client = EmailClient(
+            debug=args.debug, state_store=state_store, settings=account
+        )
+        with metrics.bind(name):
+            exit_code = 1
+            try:
+                if args.daemon:
+                    run_daemon(args, email_client, **components)
+                metrics.reset()
+                if not email_client.connect():
+                    logging.error("Failed to connect to email server")
+                    return
+                exit_code = process_mailbox(args, email_client, **components)
+            # One failing account must not stop the others
+            except SystemExit as e:
+                logging.error(f"Account {name} failed: {e.code}")
+            except Exception as e:
+                logging.error(f"Account {name} failed: {e}")
+            finally:
+                # Failed runs are written too, the daemon writes its own
+                if not args.daemon:
+                    write_metrics(
+                        email_client, components["spam_classifier"], exit_code
+                    )
+                results[name] = (exit_code, metrics.snapshot())
+                if email_client.connection:
+                    email_client.disconnect()
+
+    logging.info(f"Processing {len(accounts)} accounts")
+    threads = [
+        threading.Thread(
+            target=run_account, args=(account,), name=account["name"], daemon=True
+        )
+        for account in accounts
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        for components in components_by_file.values():
+            if components["verdict_cache"]:
+                components["verdict_cache"].close()
+
+    logging.info("=== SUMMARY PER ACCOUNT ===")
+    for account in accounts:
+        exit_code, values = results[account["name"]]
+        logging.info(
+            f"{account['name']}: {values['emails_processed']} emails, "
+            f"{values['emails_spam']} spam, {values['imap_moved_emails']} moved, "
+            f"{values['fast_path_hits'] + values['verdict_cache_hits']} without LLM, "
+            f"{values['llm_requests']} LLM requests in "
+            f"{values['llm_request_seconds']:.2f}s, run {values['run_seconds']:.2f}s"
+            f"{' - FAILED' if exit_code else ''}"
+        )
+    return 1 if any(exit_code for exit_code, _ in results.values()) else 0
+
+
+def main():
+    # Read .env once, before any setting is looked up
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="fdsmp - automated spam filter")
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Classify emails but do not move them to spam folder",
+    )
+    parser.add_argument(
+        "--debug",
+        action="store_true",
+        help="Enable debug logging for LLM classification",
+    )
+    parser.add_argument(
+        "--debug-prompt",
+        action="store_true",
+        help="Show full prompt sent to LLM (implies --debug)",
+    )
+    parser.add_argument(
+        "--emails",
+        type=int,
+        metavar="N",
+        help="Number of emails to process (overrides .env MAX_EMAILS_TO_PROCESS)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        metavar="N",
+        default=int(os.getenv("LLM_WORKERS", 1)),
+        help="Number of LLM requests kept in flight (overrides .env LLM_WORKERS)",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Fetch, classify and move concurrently instead of in three phases",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep running and classify new emails as they arrive (IMAP IDLE)",
+    )
+    parser.add_argument(
+        "--accounts",
+        metavar="FILE",
+        help="TOML file with several IMAP accounts to process concurrently",
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Run under python -X importtime and report the slowest imports",
+    )
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        return profile_startup(
+            [arg for arg in sys.argv[1:] if arg != "--profile-startup"]
+        )
+
+    # --debug-prompt implies --debug
+    if args.debug_prompt:
+        args.debug = True
+
+    # Override MAX_EMAILS_TO_PROCESS if --emails is specified
+    if args.emails:
+        os.environ["MAX_EMAILS_TO_PROCESS"] = str(args.emails)
+
+    setup_logging(multi_account=bool(args.accounts))
+
+    # Check for single instance before doing anything else
+    if not check_single_instance():
+        return 1
+
+    accounts = load_accounts(args.accounts) if args.accounts else None
+    if accounts and args.emails:
+        for account in accounts:
+            account["max_emails_to_process"] = args.emails
+
+    if args.dry_run:
+        logging.info("Starting fdsmp - spam filter (DRY RUN MODE)")
+    else:
+        logging.info("Starting fdsmp - spam filter")
+
+    # An empty STATE_DB_FILE disables the state store
+    state_store = StateStore() if os.getenv("STATE_DB_FILE", "fdsmp_state.db") else None
+    if args.daemon and not state_store:
+        # Without it every run would classify the same emails again
+        logging.error("--daemon requires the state store (STATE_DB_FILE)")
+        return 1
+    if accounts:
+        try:
+            return run_accounts(args, accounts, state_store)
+        except Exception as e:
+            logging.error(f"Fatal error: {e}")
+            return 1
+        finally:
+            if state_store:
+                state_store.close()
+
+    email_client = EmailClient(debug=args.debug, state_store=state_store)
+    components = create_components(args, TextExtractor(), state_store)
+    spam_classifier = components["spam_classifier"]
+    verdict_cache = components["verdict_cache"]
+
+    exit_code = 1
+    try:
+        if args.daemon:
+            return run_daemon(args, email_client, **components)
+
+        metrics.reset()
+        if not email_client.connect():
+            logging.error("Failed to connect to email server")
+            return 1
+        exit_code = process_mailbox(args, email_client, **components)
+        return exit_code
 
     except Exception as e:
         logging.error(f"Fatal error: {e}")
         return 1
 
     finally:
+        # Also for failed runs, FATAL errors leave with SystemExit
+        if not args.daemon:
+            write_metrics(email_client, spam_classifier, exit_code)
         # Only disconnect if we have an active connection
         if email_client.connection:
             email_client.disconnect()
-
-    return 0
+        if state_store:
+            state_store.close()
+        if verdict_cache:
+            verdict_cache.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,173 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Prometheus help texts, also the order of the exported metrics
+METRICS = {
+    "last_run_timestamp_seconds": "Unix time the run finished",
+    "run_seconds": "Duration of the run",
+    "run_failed": "1 if the run failed",
+    "emails_processed": "Emails classified",
+    "emails_spam": "Emails classified as spam",
+    "fast_path_hits": "Emails decided by a known sender without the LLM",
+    "verdict_cache_hits": "Emails decided by the verdict cache without the LLM",
+    "verdict_cache_misses": "Verdict cache lookups without a match",
+    "imap_connects": "IMAP connections opened (including login)",
+    "imap_connect_seconds": "Time spent connecting and logging in",
+    "imap_reconnects": "Sessions found dropped by the server and reopened",
+    "imap_selects": "Mailbox SELECTs (a still selected mailbox is reused)",
+    "imap_keepalives": "NOOPs sent to keep the session alive during classification",
+    "imap_fetch_seconds": "Time spent fetching emails",
+    "imap_fetch_bytes": "Bytes of message data fetched",
+    "imap_fetch_round_trips": "IMAP round trips while fetching",
+    "imap_move_seconds": "Time spent moving spam",
+    "imap_move_round_trips": "IMAP round trips while moving spam",
+    "imap_moved_emails": "Emails moved to the spam folder",
+    "extract_seconds": "Time spent extracting body text",
+    "body_text_plain": "Emails whose body text came from a text/plain part",
+    "body_text_html": "Emails whose body text came from a text/html part",
+    "body_text_none": "Emails without any body text",
+    "llm_requests": "LLM requests",
+    "llm_request_seconds": "Wall time of the LLM requests",
+    "llm_prompt_eval_seconds": "Ollama prompt evaluation time",
+    "llm_prompt_tokens": "Prompt tokens evaluated by Ollama",
+    "llm_eval_seconds": "Ollama generation time",
+    "llm_eval_tokens": "Tokens generated by Ollama",
+}
+
+
+def _escape(value) -> str:
+    """Escape a Prometheus label value"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class RunMetrics:
+    """
+    Counters and timings of one run, shared by all modules
+
+    Values only add up during a run. write() appends them as a JSON record
+    to METRICS_JSON_FILE and replaces the Prometheus node exporter textfile
+    METRICS_TEXTFILE; an empty setting disables the output.
+
+    With several accounts each account thread binds its own scope, so every
+    account counts, resets and writes its runs separately.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Account threads finishing together must not write the files at once
+        self.write_lock = threading.Lock()
+        self.local = threading.local()
+        self.scopes = {}
+        # Labels and values of the last run of each scope, for the textfile
+        self.written = {}
+        self.reset()
+
+    def _scope(self) -> dict:
+        """Values of the scope bound to this thread; call with the lock held"""
+        key = getattr(self.local, "scope", None)
+        if key not in self.scopes:
+            self.scopes[key] = {
+                "values": dict.fromkeys(METRICS, 0),
+                "started": time.monotonic(),
+            }
+        return self.scopes[key]
+
+    @contextmanager
+    def bind(self, scope: str):
+        """Count the metrics of this thread separately under scope"""
+        previous = getattr(self.local, "scope", None)
+        self.local.scope = scope
+        try:
+            yield
+        finally:
+            self.local.scope = previous
+
+    def bound(self, function):
+        """Wrap function to count in the caller's scope from another thread"""
+        scope = getattr(self.local, "scope", None)
+
+        def run(*args, **kwargs):
+            with self.bind(scope):
+                return function(*args, **kwargs)
+
+        return run
+
+    def reset(self):
+        """Start a new run of the bound scope"""
+        with self.lock:
+            self.scopes.pop(getattr(self.local, "scope", None), None)
+            self._scope()
+
+    def add(self, name: str, value=1):
+        with self.lock:
+            values = self._scope()["values"]
+            values[name] = values.get(name, 0) + value
+
+    def snapshot(self) -> dict:
+        """Values of the bound scope so far"""
+        with self.lock:
+            scope = self._scope()
+            values = dict(scope["values"])
+        values["run_seconds"] = time.monotonic() - scope["started"]
+        return values
+
+    @contextmanager
+    def timer(self, name: str):
+        """Add the duration of the with block to a _seconds metric"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def write(self, **labels):
+        """Write the values of the finished run, labelled e.g. by account"""
+        values = self.snapshot()
+        timestamp = time.time()
+        values["last_run_timestamp_seconds"] = timestamp
+        json_file = os.getenv("METRICS_JSON_FILE", "")
+        textfile = os.getenv("METRICS_TEXTFILE", "")
+
+        with self.write_lock:
+            self.written[getattr(self.local, "scope", None)] = (labels, values)
+            try:
+                if json_file:
+                    record = {
+                        "time": datetime.fromtimestamp(
+                            timestamp, timezone.utc
+                        ).isoformat(timespec="seconds"),
+                        **labels,
+                        **{name: round(value, 6) for name, value in values.items()},
+                    }
+                    with open(json_file, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(record) + "\n")
+
+                if textfile:
+                    lines = []
+                    for name in METRICS:
+                        lines.append(f"# HELP fdsmp_{name} {METRICS[name]}")
+                        lines.append(f"# TYPE fdsmp_{name} gauge")
+                        # One series per account, from its last run
+                        for scope_labels, scope_values in self.written.values():
+                            label_text = ",".join(
+                                f'{key}="{_escape(value)}"'
+                                for key, value in scope_labels.items()
+                            )
+                            lines.append(
+                                f"fdsmp_{name}{{{label_text}}} {scope_values[name]}"
+                            )
+                    # The node exporter must never see a half-written file
+                    temp_file = f"{textfile}.{os.getpid()}.tmp"
+                    with open(temp_file, "w", encoding="utf-8") as f:
+                        f.write("\n".join(lines) + "\n")
+                    os.replace(temp_file, textfile)
+            except OSError as e:
+                logging.warning(f"Failed to write metrics: {e}")
+
+
+metrics = RunMetrics()
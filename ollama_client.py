@@ -0,0 +1,94 @@
+import http.client
+import json
+import threading
+from urllib.parse import urlsplit
+
+
+class OllamaError(Exception):
+    pass
+
+
+class OllamaClient:
+    """
+    Minimal client for Ollama's native REST API
+
+    Each thread keeps its own keep-alive HTTP connection, so repeated
+    requests skip the TCP handshake.
+    """
+
+    def __init__(self, base_url: str, model: str, keep_alive: str = "1h", timeout=600):
+        url = urlsplit(base_url)
+        self.host = url.hostname or "localhost"
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.https = url.scheme == "https"
+        self.base_path = url.path.rstrip("/")
+        self.model = model
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection_class = (
+                http.client.HTTPSConnection
+                if self.https
+                else http.client.HTTPConnection
+            )
+            connection = connection_class(self.host, self.port, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+    def _post(self, path: str, payload: dict) -> dict:
+        body = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        # A keep-alive connection may have been closed by the server meanwhile
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request("POST", self.base_path + path, body, headers)
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+
+        if response.status != 200:
+            try:
+                error = json.loads(data).get("error", "")
+            except ValueError:
+                error = data[:200].decode("utf-8", errors="replace")
+            raise OllamaError(f"Ollama {path} returned HTTP {response.status}: {error}")
+        return json.loads(data)
+
+    def generate(self, prompt: str, options: dict = None, **params) -> dict:
+        """
+        Run /api/generate without streaming
+
+        Returns Ollama's response object including response text, token
+        counts and durations (in nanoseconds).
+        """
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": self.keep_alive,
+            "options": options or {},
+        }
+        payload.update(params)
+        return self._post("/api/generate", payload)
+
+    def embed(self, texts: list, model: str = None) -> list:
+        """Return one embedding vector per input text via /api/embed"""
+        result = self._post(
+            "/api/embed",
+            {
+                "model": model or self.model,
+                "input": texts,
+                "keep_alive": self.keep_alive,
+            },
+        )
+        return result["embeddings"]
@@ -0,0 +1,123 @@
+import logging
+import re
+from collections import defaultdict
+from email.utils import parseaddr
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_FROM_LINE = re.compile(r"^From:\s*(.+)$", re.MULTILINE)
+# Shared by unrelated senders, a domain says nothing about the next one
+FREEMAIL_DOMAINS = frozenset(
+    {
+        "aol.com",
+        "gmail.com",
+        "googlemail.com",
+        "gmx.at",
+        "gmx.ch",
+        "gmx.de",
+        "gmx.net",
+        "hotmail.com",
+        "hotmail.de",
+        "icloud.com",
+        "live.com",
+        "mail.de",
+        "mail.ru",
+        "me.com",
+        "msn.com",
+        "outlook.com",
+        "outlook.de",
+        "posteo.de",
+        "proton.me",
+        "protonmail.com",
+        "t-online.de",
+        "web.de",
+        "yahoo.com",
+        "yahoo.de",
+        "yandex.ru",
+    }
+)
+
+
+def sender_address(sender: str) -> str:
+    """Normalized email address of a (decoded) From header"""
+    return parseaddr(sender)[1].strip().lower()
+
+
+class SenderIndex:
+    """
+    Exact-match verdicts for senders whose classification is already known
+
+    Addresses from the examples take precedence over past verdicts, so a
+    corrected example overrides earlier mistakes. Domains only answer when
+    at least min_domain_votes example senders of that domain agree; past
+    verdicts never vote, and freemail domains never answer. 0 disables
+    domain verdicts.
+    """
+
+    def __init__(
+        self,
+        examples: List[Dict],
+        past_verdicts: Iterable[Tuple[str, str]] = (),
+        min_domain_votes: int = 0,
+    ):
+        self.min_domain_votes = min_domain_votes
+        self.example_addresses = defaultdict(set)
+        self.history_addresses = defaultdict(set)
+        self.domain_votes = defaultdict(lambda: defaultdict(int))
+
+        for example in examples:
+            match = _FROM_LINE.search(example["email"])
+            if not match:
+                continue
+            verdict = "spam" if example["classification"] == "typ 2" else "not spam"
+            self._add(
+                self.example_addresses,
+                sender_address(match.group(1)),
+                verdict,
+                domain_vote=True,
+            )
+
+        for sender, verdict in past_verdicts:
+            self._add(self.history_addresses, sender_address(sender), verdict)
+
+        logging.info(
+            f"Sender index: {len(self.example_addresses)} example and "
+            f"{len(self.history_addresses)} past sender addresses"
+        )
+
+    def _add(self, index: Dict, address: str, verdict: str, domain_vote=False):
+        if "@" not in address:
+            return
+        if verdict not in index[address]:
+            index[address].add(verdict)
+            # Only curated examples vote: an LLM verdict or a spoofed From
+            # must not turn a whole domain into a fast path
+            if domain_vote:
+                self.domain_votes[address.rsplit("@", 1)[1]][verdict] += 1
+
+    def add_verdict(self, sender: str, verdict: str):
+        """Remember a new decision, so a long-running process learns as it goes"""
+        self._add(self.history_addresses, sender_address(sender), verdict)
+
+    @staticmethod
+    def _unique(verdicts) -> Optional[str]:
+        return next(iter(verdicts)) if verdicts and len(verdicts) == 1 else None
+
+    def lookup(self, sender: str) -> Optional[str]:
+        """Return 'spam' or 'not spam' for a known sender, None if the LLM must decide"""
+        address = sender_address(sender)
+        if "@" not in address:
+            return None
+
+        if address in self.example_addresses:
+            return self._unique(self.example_addresses[address])
+        if address in self.history_addresses:
+            return self._unique(self.history_addresses[address])
+
+        domain = address.rsplit("@", 1)[1]
+        if self.min_domain_votes > 0 and domain not in FREEMAIL_DOMAINS:
+            votes = self.domain_votes.get(domain)
+            if votes and len(votes) == 1:
+                verdict, count = next(iter(votes.items()))
+                if count >= self.min_domain_votes:
+                    return verdict
+        return None
@@ -1,18 +1,50 @@
 import os
 import json
+import threading
 import time
-from langchain_ollama import OllamaLLM
-from langchain.prompts import FewShotPromptTemplate, PromptTemplate
-from dotenv import load_dotenv
+from contextlib import nullcontext
 import logging
-
-load_dotenv()
+from ollama_client import OllamaClient
+from example_selector import EmbeddingExampleSelector
+from token_counter import TokenCounter
+from metrics import metrics
+
+PROMPT_PREFIX = "Classify as 'typ 1', 'typ 2', or 'unsure' based on these examples. Pay special attention to examples from the exact same email address. Respond with EXACTLY one word only:"
+PROMPT_SUFFIX = "Email:\n{email}\n\nClassification:"
+EXAMPLE_TEMPLATE = "Email:\n{email}\n\nClassification: {classification}"
+# Between prefix, examples and email, as LangChain's FewShotPromptTemplate did
+EXAMPLE_SEPARATOR = "\n\n"
+# The prompt ends with PROMPT_SUFFIX, split around the email so that only
+# the email has to be appended per request
+SUFFIX_HEAD, SUFFIX_TAIL = PROMPT_SUFFIX.split("{email}")
+# Ways to call Ollama, LangChain is an optional extra
+LLM_BACKENDS = ("native", "langchain")
+# Kept free in the context for the model's prompt template and for tokens
+# merging across the boundaries of separately counted prompt parts
+TEMPLATE_TOKENS = 32
+# LLM answers that decide the email; "unsure" and unparseable output only
+# default to not spam
+CONFIDENT_LABELS = ("typ 1", "typ 2")
+
+# JSON schema for Ollama's structured output in constrained mode
+CLASSIFICATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "classification": {"type": "string", "enum": ["typ 1", "typ 2", "unsure"]}
+    },
+    "required": ["classification"],
+}
 
 
 class SpamClassifier:
-    def __init__(self, debug=False, debug_prompt=False):
+    def __init__(
+        self, debug=False, debug_prompt=False, examples_file=None, request_slots=None
+    ):
         self.debug = debug
         self.debug_prompt = debug_prompt
+        # Semaphore shared by the classifiers of several accounts, so they
+        # keep no more requests in flight than --workers together
+        self.request_slots = request_slots or nullcontext()
 
         # Enable LangChain debugging only in debug mode
         if debug:
@@ -24,21 +56,93 @@ class SpamClassifier:
             logging.getLogger("langchain_ollama").setLevel(logging.WARNING)
             logging.getLogger("httpx").setLevel(logging.WARNING)
 
+        self.backend = os.getenv("LLM_BACKEND", "native").lower()
+        if self.backend not in LLM_BACKENDS:
+            logging.error(
+                f"Unknown LLM_BACKEND {self.backend}, use one of {LLM_BACKENDS}"
+            )
+            raise SystemExit(f"FATAL: Unknown LLM_BACKEND {self.backend}")
         self.ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
         self.model_name = os.getenv("OLLAMA_MODEL", "llama3.1")
-        self.examples_file = os.getenv("SPAM_EXAMPLES_FILE", "spam_examples.json")
+        self.examples_file = examples_file or os.getenv(
+            "SPAM_EXAMPLES_FILE", "spam_examples.json"
+        )
         self.temperature = float(os.getenv("LLM_TEMPERATURE", "0.2"))
         self.num_ctx = int(os.getenv("LLM_NUM_CTX", "8192"))
-
-        self.llm = OllamaLLM(
-            base_url=self.ollama_base_url,
-            model=self.model_name,
-            temperature=self.temperature,
-            num_ctx=self.num_ctx,
+        self.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "1h")
+        self.prefix_cache = os.getenv("LLM_PREFIX_CACHE", "false").lower() == "true"
+        self.constrained_output = (
+            os.getenv("LLM_CONSTRAINED_OUTPUT", "false").lower() == "true"
         )
+        self.max_tokens = int(os.getenv("LLM_MAX_TOKENS", "20"))
+        self.example_selection = os.getenv("EXAMPLE_SELECTOR", "all").lower()
+        self.example_top_k = int(os.getenv("EXAMPLE_TOP_K", "20"))
+        # Context kept free for the email when deciding how many examples fit
+        self.email_tokens = int(os.getenv("LLM_EMAIL_TOKENS", "512"))
 
         self.spam_examples = self._load_examples()
-        self._setup_prompts()
+        # The LLM client and the prompts are set up by the first
+        # classification, so runs without new emails never pay for them
+        self.prepare_lock = threading.Lock()
+        self.prepared = False
+
+    def _prepare(self):
+        """Create the LLM clients and prompts, once, before the first request"""
+        with self.prepare_lock:
+            if self.prepared:
+                return
+            start_time = time.time()
+            self.llm = None
+            if self.backend == "langchain":
+                try:
+                    from langchain_ollama import OllamaLLM
+                except ImportError:
+                    logging.error("LLM_BACKEND=langchain requires langchain-ollama")
+                    raise SystemExit(
+                        "FATAL: langchain-ollama is not installed (uv sync --extra langchain)"
+                    )
+                self.llm = OllamaLLM(
+                    base_url=self.ollama_base_url,
+                    model=self.model_name,
+                    temperature=self.temperature,
+                    num_ctx=self.num_ctx,
+                    keep_alive=self.keep_alive,
+                )
+            # Prefix caching and constrained decoding need Ollama's native API
+            self.ollama = None
+            if self.backend == "native" or self.prefix_cache or self.constrained_output:
+                self.ollama = OllamaClient(
+                    self.ollama_base_url, self.model_name, keep_alive=self.keep_alive
+                )
+
+            self.token_counter = TokenCounter(
+                tokenizer_file=os.getenv("LLM_TOKENIZER_FILE")
+            )
+
+            self.example_selector = None
+            if self.example_selection == "embedding":
+                self.example_selector = EmbeddingExampleSelector(
+                    self.spam_examples,
+                    self.ollama
+                    or OllamaClient(
+                        self.ollama_base_url,
+                        self.model_name,
+                        keep_alive=self.keep_alive,
+                    ),
+                    embedding_model=os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text"),
+                    top_k=self.example_top_k,
+                    cache_file=os.getenv(
+                        "EMBEDDING_CACHE_FILE", f"{self.examples_file}.embeddings.npz"
+                    ),
+                )
+            self._setup_prompts()
+            if self.prefix_cache:
+                self._warm_prefix()
+            if self.debug:
+                logging.info(
+                    f"LLM setup took {time.time() - start_time:.2f}s before the first request"
+                )
+            self.prepared = True
 
     def _load_examples(self):
         """Load spam examples from JSON file"""
@@ -90,51 +194,213 @@ class SpamClassifier:
             logging.error(f"Failed to load examples from {self.examples_file}: {e}")
             raise SystemExit(f"FATAL: Failed to load examples: {e}")
 
-    def _estimate_tokens(self, text: str) -> int:
-        """Rough token estimation (1 token ≈ 4 characters for most models)"""
-        return len(text) // 4
+    def _format_tokens(self, tokens: int) -> str:
+        return f"{tokens}" if self.token_counter.exact else f"~{tokens}"
+
+    def _fit_examples(self, indices: list, budget: int) -> tuple[list, int]:
+        """
+        Keep as many examples, in order, as fit into budget tokens
+
+        Takes and returns indices into the rendered examples, plus the token
+        count of the prompt without email, summed up from the separately
+        counted parts.
+        """
+        count = self.token_counter.count
+        tokens = self.fixed_prompt_tokens
+        for position, i in enumerate(indices):
+            example_tokens = count(self.rendered_examples[i]) + self.separator_tokens
+            if tokens + example_tokens > budget:
+                return indices[:position], tokens
+            tokens += example_tokens
+        return indices, tokens
+
+    def _fit_email(self, email_text: str, budget: int) -> tuple[str, int]:
+        """Cut the email text until it fits into budget tokens"""
+        tokens = self.token_counter.count(email_text)
+        if tokens <= budget:
+            return email_text, tokens
+        original_tokens = tokens
+        while tokens > budget and email_text:
+            length = max(len(email_text) * max(budget, 0) // tokens - 1, 0)
+            email_text = email_text[:length]
+            tokens = self.token_counter.count(email_text)
+        logging.warning(
+            f"Email cut from {self._format_tokens(original_tokens)} to "
+            f"{self._format_tokens(tokens)} tokens to fit LLM_NUM_CTX={self.num_ctx}"
+        )
+        return email_text, tokens
 
     def _setup_prompts(self):
-        """Setup LangChain prompts with loaded examples"""
-        self.example_template = PromptTemplate(
-            input_variables=["email", "classification"],
-            template="Email:\n{email}\n\nClassification: {classification}",
+        """Render the prompt with the loaded examples, everything but the email"""
+        # Room for examples and email: the context minus answer and template
+        self.prompt_budget = self.num_ctx - self.max_tokens - TEMPLATE_TOKENS
+
+        logging.info(
+            f"Loaded and validated {len(self.spam_examples)} examples from {self.examples_file}"
         )
+        logging.info(f"Using LLM model: {self.model_name}")
 
-        self.prompt = FewShotPromptTemplate(
-            examples=self.spam_examples,
-            example_prompt=self.example_template,
-            prefix="Classify as 'typ 1', 'typ 2', or 'unsure' based on these examples. Pay special attention to examples from the exact same email address. Respond with EXACTLY one word only:",
-            suffix="Email:\n{email}\n\nClassification:",
-            input_variables=["email"],
+        # Every example is rendered once, requests only join the strings
+        self.rendered_examples = [
+            EXAMPLE_TEMPLATE.format(**example) for example in self.spam_examples
+        ]
+        # One tokenizer call for all examples instead of one each
+        self.token_counter.count_batch(self.rendered_examples)
+        count = self.token_counter.count
+        self.separator_tokens = count(EXAMPLE_SEPARATOR)
+        self.fixed_prompt_tokens = (
+            count(PROMPT_PREFIX) + self.separator_tokens + count(PROMPT_SUFFIX)
         )
 
+        examples = list(range(len(self.rendered_examples)))
+        if self.example_selector:
+            examples = examples[: self.example_top_k]
+        fitting, _ = self._fit_examples(
+            examples, self.prompt_budget - self.email_tokens
+        )
+        if len(fitting) < len(examples):
+            logging.warning(
+                f"Only {len(fitting)} of {len(examples)} examples fit into "
+                f"LLM_NUM_CTX={self.num_ctx} with LLM_EMAIL_TOKENS={self.email_tokens} "
+                "kept free, the rest is left out"
+            )
+
+        self.prompt = self._build_prompt(self.rendered_examples[i] for i in fitting)
         # Calculate base prompt size (without actual email)
-        sample_prompt = self.prompt.format(email="")
-        self.base_prompt_tokens = self._estimate_tokens(sample_prompt)
+        self.base_prompt_tokens = self.token_counter.count(
+            self._render_prompt(self.prompt, "")
+        )
+        logging.info(
+            f"Base prompt size: {self._format_tokens(self.base_prompt_tokens)} tokens "
+            f"of LLM_NUM_CTX={self.num_ctx}"
+        )
+
+    @staticmethod
+    def _build_prompt(rendered_examples) -> str:
+        """Prefix and rendered examples up to the email, as one string"""
+        return EXAMPLE_SEPARATOR.join([PROMPT_PREFIX, *rendered_examples, SUFFIX_HEAD])
+
+    @staticmethod
+    def _render_prompt(prompt: str, email_text: str) -> str:
+        # The prefix is copied once and nothing is formatted, so braces in
+        # examples or email stay as they are
+        return "".join((prompt, email_text, SUFFIX_TAIL))
+
+    def _format_prompt(self, email_text: str) -> str:
+        """
+        Render the full prompt, with only the most similar examples if enabled
+
+        Examples and email text are shortened if the prompt would not fit
+        into the context.
+        """
+        if self.example_selector:
+            indices, base_tokens = self._fit_examples(
+                self.example_selector.select_indices(email_text),
+                self.prompt_budget - self.email_tokens,
+            )
+            prompt = self._build_prompt(self.rendered_examples[i] for i in indices)
+        else:
+            prompt, base_tokens = self.prompt, self.base_prompt_tokens
 
+        email_text, email_tokens = self._fit_email(
+            email_text, self.prompt_budget - base_tokens
+        )
         logging.info(
-            f"Loaded and validated {len(self.spam_examples)} examples from {self.examples_file}"
+            f"Prompt size: {self._format_tokens(base_tokens + email_tokens)} tokens "
+            f"(base {self._format_tokens(base_tokens)} + email "
+            f"{self._format_tokens(email_tokens)}) of LLM_NUM_CTX={self.num_ctx}"
         )
-        logging.info(f"Using LLM model: {self.model_name}")
-        logging.info(f"Base prompt size: ~{self.base_prompt_tokens} tokens")
+        return self._render_prompt(prompt, email_text)
+
+    def _llm_options(self) -> dict:
+        # Identical options on every request, otherwise Ollama reloads the model
+        return {"temperature": self.temperature, "num_ctx": self.num_ctx}
+
+    def _warm_prefix(self):
+        """
+        Evaluate the static prompt prefix once so Ollama keeps it in its KV cache
 
-    def classify_email(self, email_text: str) -> tuple[str, float]:
+        Every following prompt starts with the same prefix and examples, so
+        only the tokens of the new email have to be evaluated.
+        """
         try:
+            result = self.ollama.generate(
+                self._render_prompt(self.prompt, ""),
+                options={**self._llm_options(), "num_predict": 1},
+            )
+            logging.info(
+                f"Warmed prompt prefix: {result.get('prompt_eval_count', 0)} tokens "
+                f"in {result.get('prompt_eval_duration', 0) / 1e9:.2f}s"
+            )
+        except Exception as e:
+            logging.warning(f"Failed to warm prompt prefix: {e}")
+
+    @staticmethod
+    def _record_ollama_stats(result: dict):
+        """Add Ollama's token counts and durations (nanoseconds) to the metrics"""
+        metrics.add("llm_prompt_tokens", result.get("prompt_eval_count") or 0)
+        metrics.add(
+            "llm_prompt_eval_seconds", (result.get("prompt_eval_duration") or 0) / 1e9
+        )
+        metrics.add("llm_eval_tokens", result.get("eval_count") or 0)
+        metrics.add("llm_eval_seconds", (result.get("eval_duration") or 0) / 1e9)
+
+    def _invoke_langchain(self, prompt: str) -> str:
+        """Call the LangChain LLM, keeping Ollama's statistics for the metrics"""
+        generation = self.llm.generate([prompt]).generations[0][0]
+        self._record_ollama_stats(generation.generation_info or {})
+        return generation.text
+
+    def _invoke_native(self, prompt: str) -> str:
+        """Call Ollama's /api/generate directly and log prompt-eval vs. eval time"""
+        options = self._llm_options()
+        params = {}
+        if self.constrained_output:
+            # Only the label may be generated, then the model has to stop
+            options["num_predict"] = self.max_tokens
+            options["stop"] = ["}"]
+            params["format"] = CLASSIFICATION_SCHEMA
+        result = self.ollama.generate(prompt, options=options, **params)
+        self._record_ollama_stats(result)
+        logging.info(
+            f"Prompt eval: {result.get('prompt_eval_count', 0)} tokens in "
+            f"{result.get('prompt_eval_duration', 0) / 1e9:.2f}s, "
+            f"eval: {result.get('eval_count', 0)} tokens in "
+            f"{result.get('eval_duration', 0) / 1e9:.2f}s"
+        )
+        return result.get("response", "")
+
+    def classify_email(self, email_text: str) -> tuple[str, float, str]:
+        """
+        Return the verdict, the LLM time and the raw label
+
+        The label is "typ 1", "typ 2", "unsure" or "fallback" if the answer
+        could not be parsed; only CONFIDENT_LABELS should be learned from.
+        """
+        try:
+            # One-time setup is not part of the time spent on this email
+            self._prepare()
             start_time = time.time()
             if self.debug:
                 logging.info("Starting email classification...")
                 logging.info(f"Email text length: {len(email_text)} characters")
 
+            formatted_prompt = self._format_prompt(email_text)
             if self.debug_prompt:
-                formatted_prompt = self.prompt.format(email=email_text)
                 logging.info(
                     f"Formatted prompt length: {len(formatted_prompt)} characters"
                 )
                 logging.info(f"Full prompt:\n{formatted_prompt}")
 
-            # Use LangChain LLM with FewShotPromptTemplate
-            response = self.llm.invoke(self.prompt.format(email=email_text))
+            wait_start = time.time()
+            with self.request_slots:
+                # Time spent waiting for a free slot is not LLM time
+                start_time += time.time() - wait_start
+                if self.ollama:
+                    response = self._invoke_native(formatted_prompt)
+                else:
+                    # LLM_BACKEND=langchain without a native-only feature
+                    response = self._invoke_langchain(formatted_prompt)
 
             if self.debug:
                 # Show first and last 50 characters of LLM response
@@ -149,10 +415,14 @@ class SpamClassifier:
             import re
 
             stripped = response.lower().strip()
-            match = re.search(r"(typ\s+[12]|unsure)$", stripped, re.IGNORECASE)
+            if self.constrained_output:
+                # Structured output looks like {"classification": "typ 2"
+                match = re.search(r"(typ\s+[12]|unsure)", stripped, re.IGNORECASE)
+            else:
+                match = re.search(r"(typ\s+[12]|unsure)$", stripped, re.IGNORECASE)
 
             if match:
-                found = match.group(1)
+                found = " ".join(match.group(1).split())
                 if "typ 2" in found:
                     result = "spam"
                     classification_found = found
@@ -170,6 +440,8 @@ class SpamClassifier:
 
             end_time = time.time()
             processing_time = end_time - start_time
+            metrics.add("llm_requests")
+            metrics.add("llm_request_seconds", processing_time)
 
             if self.debug:
                 if result == "spam":
@@ -180,7 +452,7 @@ class SpamClassifier:
                     logging.info(
                         f"✅ Email classified as: {result} (raw: {classification_found})"
                     )
-            return result, processing_time
+            return result, processing_time, classification_found
 
         except Exception as e:
             logging.error(f"FATAL: Failed to classify email with LLM: {e}")
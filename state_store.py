@@ -0,0 +1,137 @@
+import os
+import sqlite3
+import threading
+import logging
+from typing import Iterable, List, Set, Tuple
+
+
+class StateStore:
+    """Persistent record of classified UIDs so each run only handles new mail"""
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv("STATE_DB_FILE", "fdsmp_state.db")
+        # Shared by the stages of the pipelined mode
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.lock = threading.RLock()
+        self._create_tables()
+
+    def _create_tables(self):
+        with self.connection:
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS mailboxes (
+                    account TEXT NOT NULL,
+                    folder TEXT NOT NULL,
+                    uidvalidity INTEGER NOT NULL,
+                    last_uid INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (account, folder)
+                )
+                """
+            )
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS verdicts (
+                    account TEXT NOT NULL,
+                    folder TEXT NOT NULL,
+                    uidvalidity INTEGER NOT NULL,
+                    uid INTEGER NOT NULL,
+                    verdict TEXT NOT NULL,
+                    sender TEXT NOT NULL DEFAULT '',
+                    decided_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (account, folder, uidvalidity, uid)
+                )
+                """
+            )
+
+    def sync_uidvalidity(self, account: str, folder: str, uidvalidity: int) -> int:
+        """
+        Check the stored UIDVALIDITY of a mailbox and return its high-water mark
+
+        If the server reports a different UIDVALIDITY, all stored UIDs of the
+        mailbox are meaningless and get dropped.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT uidvalidity, last_uid FROM mailboxes WHERE account = ? AND folder = ?",
+                (account, folder),
+            ).fetchone()
+
+            if row and row[0] == uidvalidity:
+                return row[1]
+
+            with self.connection:
+                if row:
+                    logging.warning(
+                        f"UIDVALIDITY of {folder} changed ({row[0]} -> {uidvalidity}), "
+                        "discarding stored verdicts"
+                    )
+                    self.connection.execute(
+                        "DELETE FROM verdicts WHERE account = ? AND folder = ?",
+                        (account, folder),
+                    )
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO mailboxes (account, folder, uidvalidity, last_uid) "
+                    "VALUES (?, ?, ?, 0)",
+                    (account, folder, uidvalidity),
+                )
+            return 0
+
+    def get_decided_uids(
+        self, account: str, folder: str, uidvalidity: int, uids: Iterable[int]
+    ) -> Set[int]:
+        """Return the subset of UIDs that already have a verdict"""
+        with self.lock:
+            uids = list(uids)
+            decided = set()
+            # Stay below SQLite's host parameter limit
+            for i in range(0, len(uids), 500):
+                chunk = uids[i : i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.connection.execute(
+                    f"SELECT uid FROM verdicts WHERE account = ? AND folder = ? "
+                    f"AND uidvalidity = ? AND uid IN ({placeholders})",
+                    (account, folder, uidvalidity, *chunk),
+                )
+                decided.update(row[0] for row in rows)
+            return decided
+
+    def record_verdict(
+        self,
+        account: str,
+        folder: str,
+        uidvalidity: int,
+        uid: int,
+        verdict: str,
+        sender: str = "",
+    ):
+        with self.lock:
+            with self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO verdicts "
+                    "(account, folder, uidvalidity, uid, verdict, sender) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (account, folder, uidvalidity, uid, verdict, sender),
+                )
+
+    def get_sender_verdicts(self) -> List[Tuple[str, str]]:
+        """Return (sender, verdict) of all past decisions with a known sender"""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT sender, verdict FROM verdicts WHERE sender != ''"
+            ).fetchall()
+
+    def set_high_water_mark(
+        self, account: str, folder: str, uidvalidity: int, last_uid: int
+    ):
+        """Remember the highest UID up to which the mailbox has been handled"""
+        with self.lock:
+            with self.connection:
+                self.connection.execute(
+                    "UPDATE mailboxes SET last_uid = MAX(last_uid, ?) "
+                    "WHERE account = ? AND folder = ? AND uidvalidity = ?",
+                    (last_uid, account, folder, uidvalidity),
+                )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
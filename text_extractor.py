@@ -1,10 +1,224 @@
+import base64
+import binascii
+import codecs
 from email.message import Message
-from bs4 import BeautifulSoup
+from html.entities import html5
+from html.parser import HTMLParser
+import itertools
 import logging
 import os
-from dotenv import load_dotenv
+import time
+from typing import Optional
+from metrics import metrics
 
-load_dotenv()
+# Removed together with their content: links, images, scripts, styles,
+# tracking pixels and other media, meta and base tags
+REMOVED_TAGS = {
+    "img",
+    "link",
+    "script",
+    "style",
+    "video",
+    "audio",
+    "iframe",
+    "embed",
+    "object",
+    "meta",
+    "base",
+}
+# Removed, but their text is kept
+UNWRAPPED_TAGS = {"a"}
+# Elements without content (as treated by BeautifulSoup's HTML tree builder)
+VOID_TAGS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "keygen",
+    "link",
+    "menuitem",
+    "meta",
+    "param",
+    "source",
+    "track",
+    "wbr",
+    "basefont",
+    "bgsound",
+    "command",
+    "frame",
+    "image",
+    "isindex",
+    "nextid",
+    "spacer",
+}
+# Text inside these elements is not visible text
+HIDDEN_TEXT_TAGS = {"rt", "rp", "template", "script", "style"}
+
+# Characters of HTML decoded and parsed at a time when the text is limited
+CHUNK_SIZE = 8192
+# Declared charsets that mail clients really mean as a superset
+CHARSET_ALIASES = {
+    "us-ascii": "utf-8",
+    "ascii": "utf-8",
+    "iso-8859-1": "cp1252",
+    "latin1": "cp1252",
+    "latin-1": "cp1252",
+}
+_ENTITIES = {name[:-1]: char for name, char in html5.items() if name.endswith(";")}
+
+
+class _HtmlTextParser(HTMLParser):
+    """
+    Collect visible text while parsing, without building a tree
+
+    Produces the same text as the former BeautifulSoup approach (unwrap and
+    decompose the tags above, serialize, parse again, get_text with a space
+    separator): text only stays joined where no remaining markup separates
+    it, and tags are nested and closed like BeautifulSoup's html.parser
+    tree builder does.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.stack = []
+        self.open_counts = {}
+        self.removed_open = 0
+        self.already_closed = []
+        self.current = []
+        self.strings = []
+
+    def get_text(self) -> str:
+        self._break()
+        return " ".join(self.strings)
+
+    def collected_text(self) -> str:
+        """Text of the pieces finished so far, a prefix of the final text"""
+        return " ".join(self.strings)
+
+    def _break(self, visible: bool = False):
+        """Markup between two pieces of text keeps them apart"""
+        if self.current:
+            text = "".join(self.current).strip()
+            if text and (visible or not self._in_hidden_text()):
+                self.strings.append(text)
+            self.current = []
+
+    def _in_hidden_text(self) -> bool:
+        # Only elements outside of removed ones remain around the text
+        for name in self.stack:
+            if name in REMOVED_TAGS:
+                return False
+            if name in HIDDEN_TEXT_TAGS:
+                return True
+        return False
+
+    def _is_markup(self, name: str) -> bool:
+        return (
+            self.removed_open == 0
+            and name not in REMOVED_TAGS
+            and name not in UNWRAPPED_TAGS
+        )
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, handle_empty_element=False)
+        self.handle_endtag(tag)
+
+    def handle_starttag(self, tag, attrs, handle_empty_element=True):
+        if self._is_markup(tag):
+            self._break()
+        self.stack.append(tag)
+        self.open_counts[tag] = self.open_counts.get(tag, 0) + 1
+        if tag in REMOVED_TAGS:
+            self.removed_open += 1
+        if tag in VOID_TAGS and handle_empty_element:
+            self.handle_endtag(tag, check_already_closed=False)
+            # A later explicit end tag for it is ignored
+            self.already_closed.append(tag)
+
+    def handle_endtag(self, tag, check_already_closed=True):
+        if check_already_closed and tag in self.already_closed:
+            self.already_closed.remove(tag)
+            return
+        if not self.open_counts.get(tag):
+            return
+
+        # Close up to and including the most recent open element of this name
+        index = len(self.stack) - 1 - self.stack[::-1].index(tag)
+        closed = self.stack[index:]
+        if not any(name in REMOVED_TAGS for name in self.stack[:index]) and any(
+            name not in REMOVED_TAGS and name not in UNWRAPPED_TAGS
+            for name in closed[: self._count_before_removed(closed)]
+        ):
+            self._break()
+        for name in closed:
+            self.open_counts[name] -= 1
+            if name in REMOVED_TAGS:
+                self.removed_open -= 1
+        del self.stack[index:]
+
+    @staticmethod
+    def _count_before_removed(names) -> int:
+        for i, name in enumerate(names):
+            if name in REMOVED_TAGS:
+                return i
+        return len(names)
+
+    def handle_data(self, data):
+        if self.removed_open == 0:
+            self.current.append(data)
+
+    def handle_charref(self, name):
+        if name.startswith("x"):
+            codepoint = int(name.lstrip("x"), 16)
+        elif name.startswith("X"):
+            codepoint = int(name.lstrip("X"), 16)
+        else:
+            codepoint = int(name)
+        data = None
+        if codepoint < 256:
+            # Numeric references below 256 are often meant as Windows-1252
+            try:
+                data = bytearray([codepoint]).decode("windows-1252")
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(codepoint)
+            except (ValueError, OverflowError):
+                pass
+        self.handle_data(data or "\N{REPLACEMENT CHARACTER}")
+
+    def handle_entityref(self, name):
+        self.handle_data(_ENTITIES.get(name, f"&{name}"))
+
+    def _handle_special(self, text: str = None):
+        # Comments, declarations and the like separate text but are not text
+        if self.removed_open:
+            return
+        self._break()
+        if text is not None:
+            # CDATA counts as text, even inside hidden elements
+            self.current.append(text)
+            self._break(visible=True)
+
+    def handle_comment(self, data):
+        self._handle_special()
+
+    def handle_decl(self, decl):
+        self._handle_special()
+
+    def handle_pi(self, data):
+        self._handle_special()
+
+    def unknown_decl(self, data):
+        if data.upper().startswith("CDATA["):
+            self._handle_special(data[len("CDATA[") :])
+        else:
+            self._handle_special()
 
 
 class TextExtractor:
@@ -32,81 +246,172 @@ class TextExtractor:
         return cleaned_text
 
     @staticmethod
-    def _remove_links_from_html(html_content: str) -> str:
-        """Remove various types of links from HTML content before text extraction"""
-        try:
-            soup = BeautifulSoup(html_content, "html.parser")
+    def _payload_chunks(part: Message, chunk_size: int = CHUNK_SIZE):
+        """
+        Yield the transfer-decoded payload of a non-multipart part in chunks
 
-            # Remove link tags but keep text content
-            for tag in soup.find_all("a"):
-                tag.unwrap()
+        Produces the same bytes as get_payload(decode=True) for well-formed
+        parts, but lets the caller stop before the rest of a large part is
+        decoded.
+        """
+        payload = part.get_payload()
+        encoding = part.get("Content-Transfer-Encoding", "").strip().lower()
+        if encoding == "base64" and isinstance(payload, str):
+            payload = "".join(payload.split())
+        if (
+            not isinstance(payload, str)
+            or not payload.isascii()
+            or encoding not in ("base64", "quoted-printable")
+            # Truncated base64, left to the email package's repair logic
+            or (encoding == "base64" and len(payload) % 4)
+        ):
+            # Nothing to decode chunk by chunk, only to slice
+            data = part.get_payload(decode=True) or b""
+            for start in range(0, len(data), chunk_size):
+                yield data[start : start + chunk_size]
+            return
 
-            # Remove images completely
-            for tag in soup.find_all("img"):
-                tag.decompose()
+        if encoding == "base64":
+            # Four base64 characters decode to three bytes
+            step = chunk_size // 3 * 4
+            decoded = 0
+            for start in range(0, len(payload), step):
+                try:
+                    chunk = base64.b64decode(
+                        payload[start : start + step], validate=True
+                    )
+                except binascii.Error:
+                    # Invalid characters, leave the rest to the email package
+                    yield (part.get_payload(decode=True) or b"")[decoded:]
+                    return
+                decoded += len(chunk)
+                yield chunk
+        else:
+            # Soft line breaks end their line, so line-aligned chunks decode alike
+            lines = payload.splitlines(keepends=True)
+            step = max(chunk_size // 80, 1)
+            for start in range(0, len(lines), step):
+                yield binascii.a2b_qp("".join(lines[start : start + step]))
 
-            # Remove CSS/Script references
-            for tag in soup.find_all(["link", "script", "style"]):
-                tag.decompose()
+    @staticmethod
+    def _html_to_text(html_content, max_length: Optional[int] = None) -> str:
+        """
+        Extract the visible text of an HTML part in a single parse
 
-            # Remove tracking pixels and other media
-            for tag in soup.find_all(["video", "audio", "iframe", "embed", "object"]):
-                tag.decompose()
+        html_content is a string or an iterable of string chunks. With
+        max_length, parsing stops as soon as that many characters of text are
+        collected; the result is then a prefix of the complete text.
+        """
+        chunks = [html_content] if isinstance(html_content, str) else html_content
+        parser = _HtmlTextParser()
+        for chunk in chunks:
+            for start in range(0, len(chunk), CHUNK_SIZE):
+                parser.feed(chunk[start : start + CHUNK_SIZE])
+                if max_length is not None:
+                    text = TextExtractor._clean_invisible_chars(parser.collected_text())
+                    if len(text) >= max_length:
+                        return text
+        parser.close()
+        return TextExtractor._clean_invisible_chars(parser.get_text())
 
-            # Remove meta tags with URLs
-            for tag in soup.find_all("meta"):
-                tag.decompose()
+    @staticmethod
+    def _plain_to_text(text_content, max_length: Optional[int] = None) -> str:
+        """
+        Clean a text/plain part, given as a string or iterable of string chunks
 
-            # Remove base tags
-            for tag in soup.find_all("base"):
-                tag.decompose()
+        With max_length, stops once that many characters are collected.
+        """
+        chunks = [text_content] if isinstance(text_content, str) else text_content
+        collected = []
+        for chunk in chunks:
+            collected.append(chunk)
+            if max_length is not None:
+                text = TextExtractor._clean_invisible_chars("".join(collected))
+                if len(text) >= max_length:
+                    return text
+        return TextExtractor._clean_invisible_chars("".join(collected))
 
-            return str(soup)
+    @staticmethod
+    def _decoder(part: Message):
+        """Incremental decoder for the part's declared charset, UTF-8 if unknown"""
+        charset = part.get_content_charset() or "utf-8"
+        charset = CHARSET_ALIASES.get(charset, charset)
+        try:
+            return codecs.getincrementaldecoder(charset)(errors="ignore")
+        except LookupError:
+            logging.debug(f"Unknown charset {charset}, decoding as UTF-8")
+            return codecs.getincrementaldecoder("utf-8")(errors="ignore")
 
-        except Exception as e:
-            logging.warning(f"Failed to remove links from HTML: {e}")
-            return html_content  # Return original if cleaning fails
+    @staticmethod
+    def _part_to_text(part: Message, max_length: Optional[int] = None):
+        """Text of a text/plain or text/html part, None if it has no payload"""
+        decoder = TextExtractor._decoder(part)
+        chunks = (
+            decoder.decode(chunk) for chunk in TextExtractor._payload_chunks(part)
+        )
+        first = next((chunk for chunk in chunks if chunk), None)
+        if first is None:
+            return None
+        chunks = itertools.chain([first], chunks)
+        if part.get_content_type() == "text/plain":
+            return TextExtractor._plain_to_text(chunks, max_length)
+        return TextExtractor._html_to_text(chunks, max_length)
 
     @staticmethod
-    def extract_text_from_email(email_message: Message) -> str:
+    def _parts_to_text(parts, max_length: Optional[int] = None) -> str:
+        """Joined text of the parts, stopping early once max_length is reached"""
+        text_content = ""
+        for part in parts:
+            remaining = None
+            if max_length is not None:
+                remaining = max_length - len(text_content.lstrip())
+            clean_text = TextExtractor._part_to_text(part, remaining)
+            if clean_text is not None:
+                text_content += clean_text + "\n"
+                if max_length is not None and len(text_content.strip()) >= max_length:
+                    break
+        return text_content.strip()
+
+    @staticmethod
+    def extract_text_from_email(
+        email_message: Message, max_length: Optional[int] = None
+    ) -> str:
+        """
+        Visible text of the body
+
+        text/plain parts are preferred, they need no HTML parsing. The text/html
+        parts are only used if there is no plain text. Each part is decoded
+        with its declared charset.
+
+        With max_length, only text up to that length is produced: decoding and
+        parsing stop once enough characters are collected, and later parts
+        are not visited. The first max_length characters are the same as
+        without a limit.
+        """
         try:
+            extract_start = time.perf_counter()
+            parts = {"text/plain": [], "text/html": []}
+            for part in email_message.walk():
+                content_type = part.get_content_type()
+                content_disposition = str(part.get("Content-Disposition"))
+                if content_type in parts and "attachment" not in content_disposition:
+                    parts[content_type].append(part)
+
             text_content = ""
+            source = "none"
+            for content_type in ("text/plain", "text/html"):
+                text_content = TextExtractor._parts_to_text(
+                    parts[content_type], max_length
+                )
+                if text_content:
+                    source = content_type
+                    break
 
-            if email_message.is_multipart():
-                for part in email_message.walk():
-                    content_type = part.get_content_type()
-                    content_disposition = str(part.get("Content-Disposition"))
-
-                    if (
-                        content_type == "text/html"
-                        and "attachment" not in content_disposition
-                    ):
-                        payload = part.get_payload(decode=True)
-                        if payload:
-                            html_content = payload.decode("utf-8", errors="ignore")
-                            cleaned_html = TextExtractor._remove_links_from_html(
-                                html_content
-                            )
-                            soup = BeautifulSoup(cleaned_html, "html.parser")
-                            raw_text = soup.get_text(separator=" ", strip=True)
-                            clean_text = TextExtractor._clean_invisible_chars(raw_text)
-                            text_content += clean_text + "\n"
-            else:
-                content_type = email_message.get_content_type()
-                payload = email_message.get_payload(decode=True)
-
-                if payload:
-                    if content_type == "text/html":
-                        html_content = payload.decode("utf-8", errors="ignore")
-                        cleaned_html = TextExtractor._remove_links_from_html(
-                            html_content
-                        )
-                        soup = BeautifulSoup(cleaned_html, "html.parser")
-                        raw_text = soup.get_text(separator=" ", strip=True)
-                        text_content = TextExtractor._clean_invisible_chars(raw_text)
-
-            text_content = text_content.strip()
-            logging.debug(f"Extracted text length: {len(text_content)} characters")
+            metrics.add(f"body_text_{source.removeprefix('text/')}")
+            metrics.add("extract_seconds", time.perf_counter() - extract_start)
+            logging.debug(
+                f"Extracted text length: {len(text_content)} characters ({source})"
+            )
             return text_content
 
         except Exception as e:
@@ -147,9 +452,11 @@ class TextExtractor:
         except Exception:
             pass  # Keep original if decode fails
 
-        # Extract body text and truncate to configured length
-        body_text = TextExtractor.extract_text_from_email(email_data["message"])
+        # Extract only as much body text as the configured length needs
         body_length = int(os.getenv("MAIL_BODY_LENGTH", 200))
+        body_text = TextExtractor.extract_text_from_email(
+            email_data["message"], max_length=body_length
+        )
 
         if body_text:
             truncated_body = body_text[:body_length].strip()
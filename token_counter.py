@@ -0,0 +1,72 @@
+import logging
+import threading
+from collections import OrderedDict
+
+
+class TokenCounter:
+    """
+    Count tokens with the model's own tokenizer
+
+    Counts are exact with a local HuggingFace tokenizer.json of the model.
+    Ollama has no documented tokenize endpoint, so without one counts are
+    estimated from the UTF-8 length. Counts are cached, so the static
+    prompt parts are only tokenized once.
+    """
+
+    def __init__(self, tokenizer_file: str = None, cache_size=10000):
+        self.cache_size = cache_size
+        # False when counts are only estimated
+        self.exact = False
+        self.tokenizer = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+        if tokenizer_file:
+            try:
+                from tokenizers import Tokenizer
+            except ImportError:
+                logging.error("LLM_TOKENIZER_FILE requires the tokenizers package")
+                raise SystemExit(
+                    "FATAL: tokenizers is not installed (uv sync --extra tokenizer)"
+                )
+            try:
+                self.tokenizer = Tokenizer.from_file(tokenizer_file)
+            except Exception as e:
+                logging.error(f"Failed to load tokenizer {tokenizer_file}: {e}")
+                raise SystemExit(f"FATAL: Failed to load tokenizer: {e}")
+            self.exact = True
+
+    @staticmethod
+    def estimate(text: str) -> int:
+        """Generous estimate, umlauts, emoji and URLs take more than 4 chars/token"""
+        return (len(text.encode("utf-8")) + 2) // 3
+
+    def count(self, text: str) -> int:
+        if not self.tokenizer:
+            return self.estimate(text)
+        with self._lock:
+            if text in self._cache:
+                self._cache.move_to_end(text)
+                return self._cache[text]
+
+        tokens = len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+        with self._lock:
+            self._cache[text] = tokens
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def count_batch(self, texts: list) -> list:
+        """Count several texts, uncached ones in one batch call of the tokenizer"""
+        if not self.tokenizer:
+            return [self.estimate(text) for text in texts]
+        with self._lock:
+            missing = list(dict.fromkeys(t for t in texts if t not in self._cache))
+        if missing:
+            encodings = self.tokenizer.encode_batch(missing, add_special_tokens=False)
+            with self._lock:
+                for text, encoding in zip(missing, encodings):
+                    self._cache[text] = len(encoding.ids)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return [self.count(text) for text in texts]
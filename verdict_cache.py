@@ -0,0 +1,151 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+_WORD = re.compile(r"\w+")
+
+
+def _normalize(text: str) -> str:
+    """Lowercase, mask numbers and collapse whitespace so resent mails hash alike"""
+    text = re.sub(r"\d+", "0", text.lower())
+    return " ".join(text.split())
+
+
+def _simhash(text: str) -> int:
+    """64-bit SimHash over word pairs, as signed integer for SQLite"""
+    words = _WORD.findall(text)
+    features = [" ".join(words[i : i + 2]) for i in range(max(len(words) - 1, 1))]
+    weights = [0] * 64
+    for feature in features:
+        value = int.from_bytes(hashlib.md5(feature.encode("utf-8")).digest()[:8], "big")
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    result = sum(1 << bit for bit in range(64) if weights[bit] > 0)
+    return result - (1 << 64) if result >= 1 << 63 else result
+
+
+class VerdictCache:
+    """
+    Persistent LRU cache of verdicts keyed by a hash of the analysis text
+
+    The cache is cleared automatically when the examples file or the model
+    changes, because earlier verdicts may no longer be valid.
+    """
+
+    def __init__(self, examples_file: str, model_name: str, path: str = None):
+        self.path = path or os.getenv("VERDICT_CACHE_FILE", "fdsmp_verdicts.db")
+        self.max_size = int(os.getenv("VERDICT_CACHE_SIZE", 5000))
+        # Maximum SimHash bit distance for near duplicates, 0 = exact matches only
+        self.near_duplicate_distance = int(
+            os.getenv("VERDICT_CACHE_SIMHASH_DISTANCE", 3)
+        )
+        # Shared by the stages of the pipelined mode
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.lock = threading.RLock()
+        self._create_tables()
+        self._check_fingerprint(self._fingerprint(examples_file, model_name))
+
+    def _create_tables(self):
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS verdicts (
+                    hash TEXT PRIMARY KEY,
+                    simhash INTEGER NOT NULL,
+                    verdict TEXT NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS verdicts_last_used ON verdicts (last_used)"
+            )
+
+    @staticmethod
+    def _fingerprint(examples_file: str, model_name: str) -> str:
+        digest = hashlib.sha256(model_name.encode("utf-8") + b"\0")
+        try:
+            with open(examples_file, "rb") as f:
+                digest.update(f.read())
+        except OSError:
+            pass
+        return digest.hexdigest()
+
+    def _check_fingerprint(self, fingerprint: str):
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = 'fingerprint'"
+        ).fetchone()
+        if row and row[0] == fingerprint:
+            return
+        with self.connection:
+            if row:
+                logging.info("Examples or model changed, clearing verdict cache")
+            self.connection.execute("DELETE FROM verdicts")
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('fingerprint', ?)",
+                (fingerprint,),
+            )
+
+    def lookup(self, text: str) -> Optional[str]:
+        """Return the cached verdict for this text or a near duplicate"""
+        with self.lock:
+            normalized = _normalize(text)
+            key = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+            row = self.connection.execute(
+                "SELECT hash, verdict FROM verdicts WHERE hash = ?", (key,)
+            ).fetchone()
+
+            if row is None and self.near_duplicate_distance > 0:
+                simhash = _simhash(normalized)
+                for (
+                    candidate_key,
+                    candidate_simhash,
+                    verdict,
+                ) in self.connection.execute(
+                    "SELECT hash, simhash, verdict FROM verdicts"
+                ):
+                    distance = (
+                        (candidate_simhash ^ simhash) & (1 << 64) - 1
+                    ).bit_count()
+                    if distance <= self.near_duplicate_distance:
+                        row = (candidate_key, verdict)
+                        break
+
+            if row is None:
+                return None
+
+            with self.connection:
+                self.connection.execute(
+                    "UPDATE verdicts SET last_used = ? WHERE hash = ?",
+                    (time.time(), row[0]),
+                )
+            return row[1]
+
+    def store(self, text: str, verdict: str):
+        with self.lock:
+            normalized = _normalize(text)
+            key = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+            with self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO verdicts (hash, simhash, verdict, last_used) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, _simhash(normalized), verdict, time.time()),
+                )
+                # Evict least recently used entries beyond the size limit
+                self.connection.execute(
+                    "DELETE FROM verdicts WHERE hash IN (SELECT hash FROM verdicts "
+                    "ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_size,),
+                )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()